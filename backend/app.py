@@ -8,7 +8,17 @@ from database import db
 from routes import register_routes
 from routes.card_routes import card_routes
 from models.set_collection_count import SetCollectionCount
+from models.card_name import CardName
 from errors import handle_error
+from cache import invalidate_cache, LocalCache
+from cache_client import ResilientRedis, CircuitBreaker
+from metrics import MetricsBuffer
+from warming import warm_cache
+from import_jobs import init_import_workers
+from card_serialization import benchmark_set_serialization
+from catalog_ingest import ingest_cards, load_sets, CATALOG_DOMAINS
+from sqlalchemy import func
+import click
 import redis
 import orjson
 
@@ -32,13 +42,33 @@ def create_app(config_name='default'):
     # Import models here
     from models import Card, Set, SetCollectionCount
 
-    # Initialize Redis
-    app.redis_client = redis.Redis(
-        host=app.config['REDIS_HOST'],
-        port=app.config['REDIS_PORT'],
-        db=app.config['REDIS_DB']
+    # Initialize Redis behind a circuit breaker so a stalled server cannot hang the workers
+    app.redis_client = ResilientRedis(
+        redis.Redis(
+            host=app.config['REDIS_HOST'],
+            port=app.config['REDIS_PORT'],
+            db=app.config['REDIS_DB'],
+            socket_connect_timeout=app.config['REDIS_CONNECT_TIMEOUT'],
+            socket_timeout=app.config['REDIS_SOCKET_TIMEOUT']
+        ),
+        CircuitBreaker(
+            failure_threshold=app.config['CACHE_BREAKER_FAILURE_THRESHOLD'],
+            reset_timeout=app.config['CACHE_BREAKER_RESET_TIMEOUT']
+        )
     )
 
+    # Per-worker in-memory cache tier in front of Redis
+    app.local_cache = LocalCache(
+        max_bytes=app.config['CACHE_LOCAL_MAX_BYTES'],
+        generation_ttl=app.config['CACHE_LOCAL_GENERATION_TTL']
+    ) if app.config['CACHE_LOCAL_ENABLED'] else None
+
+    # Request metrics accumulate in memory and reach Redis from a background flusher
+    app.metrics_buffer = MetricsBuffer(flush_interval=app.config['CACHE_METRICS_FLUSH_INTERVAL'])
+
+    # Worker pool that applies queued CSV imports
+    init_import_workers(app)
+
     # Register routes
     register_routes(app)
     app.register_blueprint(card_routes, url_prefix='/api')
@@ -54,11 +84,69 @@ def create_app(config_name='default'):
 
     # Register the custom CLI command
     @app.cli.command("refresh-collection-counts")
+    @click.option('--warm', is_flag=True, help='Pre-render cached pages afterwards.')
     @with_appcontext
-    def refresh_collection_counts():
+    def refresh_collection_counts(warm):
         """Refresh the set_collection_counts materialized view."""
         SetCollectionCount.refresh()
+        invalidate_cache('collection')
         print("Set collection counts refreshed successfully.")
+        if warm:
+            summary = warm_cache(app)
+            print(f"Cache warmed: {summary['warmed']} pages ({summary['failed']} failed).")
+
+    @app.cli.command("refresh-card-names")
+    @with_appcontext
+    def refresh_card_names():
+        """Refresh the card_names materialized view behind the typeahead endpoint."""
+        CardName.refresh()
+        invalidate_cache('catalog')
+        print("Card names refreshed successfully.")
+
+    @app.cli.command("ingest-scryfall")
+    @click.argument('bulk_file', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--sets', 'sets_file', type=click.Path(exists=True, dir_okay=False), default=None,
+                  help='Saved Scryfall /sets response to load before the cards.')
+    @click.option('--batch-size', type=int, default=None, help='Cards per batch. Defaults to CATALOG_INGEST_BATCH_SIZE.')
+    @with_appcontext
+    def ingest_scryfall(bulk_file, sets_file, batch_size):
+        """Load a Scryfall bulk card file into cards and sets, leaving inventory quantities alone."""
+        if sets_file:
+            print(f"Loaded {load_sets(sets_file)} sets.")
+        summary = ingest_cards(bulk_file, batch_size or app.config['CATALOG_INGEST_BATCH_SIZE'])
+        if summary['inserted'] or summary['updated']:
+            CardName.refresh()
+            SetCollectionCount.refresh()
+        # Only the cached pages of sets whose cards were written go stale
+        if summary['set_codes']:
+            invalidate_cache(*CATALOG_DOMAINS, set_codes=summary['set_codes'])
+        print(f"Read {summary['cards']} cards in {summary['batches']} batches in {summary['elapsed_seconds']}s: "
+              f"{summary['inserted']} new, {summary['updated']} rewritten, {summary['price_updated']} repriced, "
+              f"{summary['unchanged']} unchanged.")
+        print(f"Sets touched ({len(summary['set_codes'])}): {', '.join(summary['set_codes']) or 'none'}")
+
+    @app.cli.command("warm-cache")
+    @click.option('--set', 'set_codes', multiple=True, help='Set code to warm (repeatable). Defaults to every set.')
+    @click.option('--concurrency', type=int, default=None, help='Parallel requests. Defaults to CACHE_WARM_CONCURRENCY.')
+    def warm_cache_command(set_codes, concurrency):
+        """Pre-render cached set pages, the default collection listing and stats."""
+        summary = warm_cache(app, set_codes=set_codes or None, concurrency=concurrency)
+        print(f"Cache warmed: {summary['warmed']} pages for {summary['sets']} sets "
+              f"({summary['failed']} failed) in {summary['elapsed_seconds']}s.")
+
+    @app.cli.command("benchmark-set-cards")
+    @click.option('--set', 'set_code', default=None, help='Set to serialize. Defaults to the set closest to 500 cards.')
+    @click.option('--runs', type=int, default=20, help='Timed runs per serialization path.')
+    @with_appcontext
+    def benchmark_set_cards(set_code, runs):
+        """Compare ORM, Core and json_agg serialization of one set's cards."""
+        if set_code is None:
+            set_code = Set.query.with_entities(Set.code).filter(Set.card_count.isnot(None)) \
+                .order_by(func.abs(Set.card_count - 500)).limit(1).scalar()
+        card_count = Card.query.filter(Card.set_code == set_code).count()
+        print(f"Serializing {card_count} cards from {set_code}, {runs} runs per path:")
+        for path, result in benchmark_set_serialization(set_code, runs).items():
+            print(f"  {path:<9} median {result['median_ms']:>8.2f} ms  best {result['best_ms']:>8.2f} ms  {result['bytes']} bytes")
 
     # Add a route to list all available routes
     @app.route('/routes', methods=['GET'])
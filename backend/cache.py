@@ -0,0 +1,421 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+from flask import current_app, request
+from time import time, sleep
+import orjson
+from redis.exceptions import RedisError
+import threading
+import hashlib
+import logging
+import os
+import gzip
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Every cached entry carries the generation counters of the domains it was built
+# from. Bumping a counter orphans the affected entries; they age out via their TTL.
+GENERATION_PREFIX = 'cache:gen:'
+GLOBAL_DOMAIN = 'global'
+
+# Generation bumps are broadcast on this channel so every worker's local tier
+# drops the affected entries.
+INVALIDATION_CHANNEL = 'cache:invalidate'
+
+
+class CacheEntry(NamedTuple):
+    """
+    A cached response body with its ETag and the time until which it counts as fresh.
+
+    Large bodies are stored compressed; `encoding` names the content coding
+    ('gzip' or 'zstd') or is empty for identity. The ETag always hashes the
+    uncompressed body.
+    """
+    body: bytes
+    etag: str
+    fresh_until: float
+    encoding: str = ''
+
+    @property
+    def is_fresh(self) -> bool:
+        return time() < self.fresh_until
+
+    @property
+    def identity_body(self) -> bytes:
+        """The uncompressed body."""
+        return decompress_body(self.body, self.encoding)
+
+    @classmethod
+    def build(cls, body: bytes, timeout: int, compression: Optional[str] = None,
+              compress_min_bytes: int = 0) -> 'CacheEntry':
+        """Wrap a serialized body, hashing it into an ETag and compressing it if it is large enough."""
+        etag = content_etag(body)
+        encoding = ''
+        if compression and len(body) >= compress_min_bytes:
+            body, encoding = compress_body(body, compression), compression
+        return cls(body=body, etag=etag, fresh_until=time() + timeout, encoding=encoding)
+
+
+def content_etag(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def available_compression(preferred: str) -> Optional[str]:
+    """Resolve the configured cache compression, falling back to gzip when zstandard is missing."""
+    if preferred == 'zstd':
+        return 'zstd' if zstandard is not None else 'gzip'
+    if preferred == 'gzip':
+        return 'gzip'
+    return None
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return gzip.compress(body, compresslevel=5)
+
+
+def decompress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(body)
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    return body
+
+
+# Entries are stored as Redis hashes so conditional requests can read the
+# metadata without transferring the body.
+def read_entry_meta(cache_key: str) -> Optional[Tuple[str, float]]:
+    """Fetch only the ETag and freshness of a cached entry."""
+    etag, fresh_until = current_app.redis_client.hmget(cache_key, 'etag', 'fresh_until')
+    if etag is None or fresh_until is None:
+        return None
+    return etag.decode(), float(fresh_until)
+
+
+def read_entry(cache_key: str) -> Optional[CacheEntry]:
+    body, etag, fresh_until, encoding = current_app.redis_client.hmget(
+        cache_key, 'body', 'etag', 'fresh_until', 'encoding'
+    )
+    if body is None or etag is None or fresh_until is None:
+        return None
+    return CacheEntry(body=body, etag=etag.decode(), fresh_until=float(fresh_until),
+                      encoding=(encoding or b'').decode())
+
+
+def write_entry(cache_key: str, entry: CacheEntry, timeout: int) -> None:
+    """Store an entry with a hard TTL in one round trip."""
+    pipe = current_app.redis_client.pipeline(transaction=True)
+    pipe.hset(cache_key, mapping=entry._asdict())
+    pipe.expire(cache_key, timeout)
+    pipe.execute()
+
+
+def wait_for_entry(cache_key: str, max_wait: float, interval: float = 0.05) -> Optional[CacheEntry]:
+    """
+    Poll Redis for an entry another worker is computing.
+
+    Returns:
+        Optional[CacheEntry]: The entry once it appears, or None after `max_wait` seconds.
+    """
+    deadline = time() + max_wait
+    while time() < deadline:
+        sleep(interval)
+        entry = read_entry(cache_key)
+        if entry:
+            return entry
+    return None
+
+
+class LocalCache:
+    """
+    Size-bounded, per-process LRU of cached entries sitting in front of Redis.
+
+    Entries remember the generation counters they were built from. Invalidation
+    messages published by `invalidate_cache` evict the dependent entries in every
+    worker and update the locally known generations, so hot keys can be resolved
+    without a network hop. Known generations also expire after `generation_ttl`
+    seconds as a safety net against missed messages.
+    """
+
+    def __init__(self, max_bytes: int, generation_ttl: int):
+        self.max_bytes = max_bytes
+        self.generation_ttl = generation_ttl
+        self._entries: 'OrderedDict[str, Tuple[CacheEntry, float, Tuple[str, ...]]]' = OrderedDict()
+        self._generations: Dict[str, Tuple[int, float]] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._subscriber_pid: Optional[int] = None
+        self._seen_recoveries = 0
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the cached entry for a key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, _ = entry
+            if expires_at < time():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: CacheEntry, timeout: int, deps: Iterable[str] = ()) -> None:
+        """Store an entry under a key, evicting least recently used entries to stay within max_bytes."""
+        if len(value.body) > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (value, time() + timeout, tuple(deps))
+            self._size += len(value.body)
+            while self._size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._size = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'generations': len(self._generations),
+            }
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[0].body)
+
+    def get_generations(self, keys: Iterable[str], include_expired: bool = False) -> Dict[str, int]:
+        """Return the locally known generation counters among `keys`, unexpired ones unless `include_expired`."""
+        now = time()
+        with self._lock:
+            return {
+                key: self._generations[key][0] for key in keys
+                if key in self._generations and (include_expired or self._generations[key][1] > now)
+            }
+
+    def set_generations(self, generations: Dict[str, int]) -> None:
+        """
+        Remember generation counters read from Redis.
+
+        A read can race with an invalidation that apply_invalidation already
+        recorded, so an unexpired newer counter is kept (without extending its
+        TTL). Once it expires the value from Redis is taken as is, so a counter
+        reset on the Redis side is still picked up.
+        """
+        now = time()
+        expires_at = now + self.generation_ttl
+        with self._lock:
+            for key, value in generations.items():
+                known, known_expires_at = self._generations.get(key, (0, 0))
+                if known > value and known_expires_at > now:
+                    continue
+                self._generations[key] = (value, expires_at)
+
+    def apply_invalidation(self, generations: Dict[str, int]) -> None:
+        """Record bumped generation counters and evict every entry that depends on them."""
+        bumped = set(generations)
+        expires_at = time() + self.generation_ttl
+        with self._lock:
+            for key, value in generations.items():
+                # Never move a counter backwards if a newer value was already fetched
+                known = self._generations.get(key, (0, 0))[0]
+                self._generations[key] = (max(known, value), expires_at)
+            stale = [key for key, (_, _, deps) in self._entries.items() if bumped.intersection(deps)]
+            for key in stale:
+                self._pop(key)
+
+    def ensure_subscribed(self, redis_client) -> None:
+        """
+        Start the invalidation listener for the current process.
+
+        Called lazily on use so that each forked gunicorn worker runs its own
+        listener thread; a new listener starts from an empty cache. While Redis
+        is unavailable the subscription is retried on a later call.
+        """
+        pid = os.getpid()
+        if self._subscriber_pid == pid or not redis_client.available:
+            return
+        with self._lock:
+            if self._subscriber_pid == pid:
+                return
+            self._entries.clear()
+            self._generations.clear()
+            self._size = 0
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{INVALIDATION_CHANNEL: self._handle_message})
+                pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=self._handle_listener_error)
+            except RedisError as e:
+                logger.warning(f"Local cache could not subscribe to {INVALIDATION_CHANNEL}: {str(e)}")
+                return
+            self._subscriber_pid = pid
+            logger.info(f"Local cache subscribed to {INVALIDATION_CHANNEL} in process {pid}")
+
+    def sync_after_outage(self, recoveries: int) -> None:
+        """Drop everything once Redis comes back, since invalidation messages may have been missed."""
+        if recoveries != self._seen_recoveries:
+            self._seen_recoveries = recoveries
+            self.clear()
+
+    def _handle_listener_error(self, error: Exception, pubsub, thread) -> None:
+        # Messages may be lost while disconnected; the pubsub reconnects and resubscribes on the next poll
+        logger.warning(f"Cache invalidation listener error, clearing local cache: {str(error)}")
+        self.clear()
+        sleep(1)
+
+    def _handle_message(self, message: dict) -> None:
+        try:
+            self.apply_invalidation(orjson.loads(message['data']))
+        except orjson.JSONDecodeError:
+            logger.warning(f"Ignoring malformed cache invalidation message: {message['data']!r}")
+
+
+def get_local_cache() -> Optional[LocalCache]:
+    """Return the app's local cache tier with its listener running, or None if disabled."""
+    local_cache = getattr(current_app, 'local_cache', None)
+    if local_cache is not None:
+        local_cache.ensure_subscribed(current_app.redis_client)
+        local_cache.sync_after_outage(current_app.redis_client.recoveries)
+    return local_cache
+
+
+def sync_after_outage() -> None:
+    """Replay a global invalidation that could not be written while Redis was down."""
+    redis_client = current_app.redis_client
+    if redis_client.missed_invalidation and redis_client.available:
+        redis_client.missed_invalidation = False
+        logger.warning("Replaying cache invalidation missed during a Redis outage")
+        invalidate_cache()
+
+
+def generation_key(domain: str, set_code: Optional[str] = None) -> str:
+    """Build the Redis key holding the generation counter for a domain (and set)."""
+    if set_code:
+        return f"{GENERATION_PREFIX}{domain}:set:{set_code}"
+    return f"{GENERATION_PREFIX}{domain}"
+
+
+def generation_keys(domains: Iterable[str], set_code: Optional[str] = None) -> List[str]:
+    """
+    List the generation counters a cache entry depends on.
+
+    Args:
+        domains (Iterable[str]): Inventory domains the entry reads ('collection', 'kiosk').
+        set_code (Optional[str]): Set the entry is scoped to, if any.
+
+    Returns:
+        List[str]: The global counter followed by one counter per domain.
+    """
+    return [generation_key(GLOBAL_DOMAIN)] + [generation_key(domain, set_code) for domain in domains]
+
+
+def current_generations(keys: List[str]) -> str:
+    """
+    Resolve the given generation counters and join them into a key fragment.
+
+    Counters known to the local tier are used as is; the rest are fetched in a
+    single MGET and remembered locally.
+    """
+    sync_after_outage()
+    local_cache = get_local_cache()
+    generations = local_cache.get_generations(keys) if local_cache else {}
+    missing = [key for key in keys if key not in generations]
+    if missing:
+        fetched = {key: int(value or 0) for key, value in zip(missing, current_app.redis_client.mget(missing))}
+        if local_cache:
+            local_cache.set_generations(fetched)
+        generations.update(fetched)
+    return '.'.join(str(generations[key]) for key in keys)
+
+
+def resolve_key(base_key: str, domains: Iterable[str], set_code: Optional[str] = None) -> Tuple[str, List[str]]:
+    """
+    Version a cache key with the current generations of the domains it depends on.
+
+    Returns:
+        Tuple[str, List[str]]: The versioned key and the generation counters it depends on.
+    """
+    keys = generation_keys(domains, set_code)
+    return f"{base_key}:g{current_generations(keys)}", keys
+
+
+def offline_key(base_key: str, domains: Iterable[str], set_code: Optional[str] = None) -> Optional[Tuple[str, List[str]]]:
+    """
+    Version a cache key from the local tier's last known generations, without Redis.
+
+    Returns:
+        Optional[Tuple[str, List[str]]]: The versioned key and its dependencies, or
+        None if some generation was never seen by this worker.
+    """
+    local_cache = getattr(current_app, 'local_cache', None)
+    if local_cache is None:
+        return None
+    keys = generation_keys(domains, set_code)
+    generations = local_cache.get_generations(keys, include_expired=True)
+    if len(generations) < len(keys):
+        return None
+    return f"{base_key}:g{'.'.join(str(generations[key]) for key in keys)}", keys
+
+
+def versioned_key(base_key: str, domains: Iterable[str], set_code: Optional[str] = None) -> str:
+    """Prefix a cache key with the current generations of the domains it depends on."""
+    return resolve_key(base_key, domains, set_code)[0]
+
+
+def request_set_code(view_kwargs: dict) -> Optional[str]:
+    """Resolve the set a request is scoped to from the URL or the query string."""
+    return view_kwargs.get('set_code') or request.args.get('set_code') or None
+
+
+def invalidate_cache(*domains: str, set_codes: Iterable[str] = ()) -> None:
+    """
+    Invalidate cached responses by bumping generation counters.
+
+    Each domain's unscoped counter is bumped, along with the per-set counter of
+    every set in `set_codes`. Passing no domains bumps the global counter, which
+    orphans every cached entry.
+
+    Args:
+        *domains (str): Inventory domains that changed ('collection', 'kiosk').
+        set_codes (Iterable[str]): Sets whose cards changed.
+    """
+    set_codes = {code for code in set_codes if code}
+    keys = [generation_key(GLOBAL_DOMAIN)] if not domains else []
+    for domain in domains:
+        keys.append(generation_key(domain))
+        keys.extend(generation_key(domain, code) for code in set_codes)
+
+    try:
+        pipe = current_app.redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.incr(key)
+        bumped = dict(zip(keys, pipe.execute()))
+    except RedisError as e:
+        # Entries may now be stale anywhere; invalidate everything once Redis is back
+        logger.error(f"Could not invalidate cache generations {', '.join(keys)}: {str(e)}")
+        current_app.redis_client.missed_invalidation = True
+        if getattr(current_app, 'local_cache', None) is not None:
+            current_app.local_cache.clear()
+        return
+
+    # Tell every worker's local tier to drop entries built from the old generations
+    local_cache = get_local_cache()
+    if local_cache:
+        local_cache.apply_invalidation(bumped)
+    try:
+        current_app.redis_client.publish(INVALIDATION_CHANNEL, orjson.dumps(bumped))
+    except RedisError as e:
+        logger.warning(f"Could not publish cache invalidation: {str(e)}")
+    logger.info(f"Invalidated cache generations: {', '.join(keys)}")
@@ -0,0 +1,176 @@
+from typing import Any, Callable, Dict, Optional
+from redis.exceptions import ConnectionError, TimeoutError, RedisError
+from time import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CacheUnavailableError(ConnectionError):
+    """Raised without touching the network while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail fast for `reset_timeout` seconds. Then a single trial call is let
+    through (half-open); its success closes the circuit, its failure reopens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go to Redis right now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> bool:
+        """Record a successful call. Returns True if this closed an open circuit."""
+        with self._lock:
+            recovered = self.state != self.CLOSED
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+        if recovered:
+            logger.warning("Redis circuit breaker closed, cache re-enabled")
+        return recovered
+
+    def record_failure(self, error: Exception) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = str(error)
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.error(f"Redis circuit breaker opened after {self.consecutive_failures} failures: {error}")
+                self.state = self.OPEN
+                self.opened_at = time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = round(max(0.0, self.reset_timeout - (time() - self.opened_at)), 2)
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout,
+                'retry_in': retry_in,
+                'last_error': self.last_error,
+            }
+
+
+class ResilientRedis:
+    """
+    Proxy around a redis.Redis client that routes every network call through a circuit breaker.
+
+    Commands, pipeline executions and lock operations fail fast with
+    CacheUnavailableError while the circuit is open, so a Redis stall costs at
+    most one socket timeout per request instead of hanging every worker.
+    Connection and timeout errors trip the breaker; other Redis errors (such as
+    a wrong type) pass through without affecting it.
+    """
+
+    def __init__(self, client, breaker: CircuitBreaker):
+        self._client = client
+        self.breaker = breaker
+        # Set when an invalidation could not be written; see cache.sync_after_outage
+        self.missed_invalidation = False
+        # Number of times the circuit closed again after an outage
+        self.recoveries = 0
+
+    @property
+    def available(self) -> bool:
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        if not self.breaker.allow():
+            raise CacheUnavailableError('Redis circuit breaker is open')
+        try:
+            result = fn(*args, **kwargs)
+        except (ConnectionError, TimeoutError) as e:
+            self.breaker.record_failure(e)
+            raise
+        except RedisError:
+            # Redis answered, so it is reachable
+            self._record_success()
+            raise
+        self._record_success()
+        return result
+
+    def _record_success(self) -> None:
+        if self.breaker.record_success():
+            self.recoveries += 1
+
+    def pipeline(self, *args, **kwargs) -> '_ResilientPipeline':
+        return _ResilientPipeline(self, self._client.pipeline(*args, **kwargs))
+
+    def lock(self, *args, **kwargs) -> '_ResilientLock':
+        return _ResilientLock(self, self._client.lock(*args, **kwargs))
+
+    def pubsub(self, **kwargs):
+        # The listener thread manages its own connection and reconnects by itself
+        return self._client.pubsub(**kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def guarded(*args, **kwargs):
+            return self.call(attr, *args, **kwargs)
+        return guarded
+
+
+class _ResilientPipeline:
+    """Queues commands locally and sends them through the breaker on execute."""
+
+    def __init__(self, owner: ResilientRedis, pipeline):
+        self._owner = owner
+        self._pipeline = pipeline
+
+    def execute(self, *args, **kwargs):
+        try:
+            return self._owner.call(self._pipeline.execute, *args, **kwargs)
+        finally:
+            self._pipeline.reset()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._pipeline, name)
+
+
+class _ResilientLock:
+    def __init__(self, owner: ResilientRedis, lock):
+        self._owner = owner
+        self._lock = lock
+
+    def acquire(self, *args, **kwargs) -> bool:
+        return self._owner.call(self._lock.acquire, *args, **kwargs)
+
+    def release(self) -> None:
+        self._owner.call(self._lock.release)
@@ -0,0 +1,342 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import and_, or_, not_, true, func, extract, cast
+from sqlalchemy.dialects.postgresql import JSONB
+from models.card import Card
+from utils import escape_like
+import re
+
+# Ordered so comparisons like r>=rare work
+RARITIES = ['common', 'uncommon', 'rare', 'special', 'mythic', 'bonus']
+
+COLOR_NAMES = {
+    'white': 'W', 'blue': 'U', 'black': 'B', 'red': 'R', 'green': 'G',
+    'azorius': 'WU', 'dimir': 'UB', 'rakdos': 'BR', 'gruul': 'RG', 'selesnya': 'GW',
+    'orzhov': 'WB', 'izzet': 'UR', 'golgari': 'BG', 'boros': 'RW', 'simic': 'GU',
+    'bant': 'GWU', 'esper': 'WUB', 'grixis': 'UBR', 'jund': 'BRG', 'naya': 'RGW',
+    'abzan': 'WBG', 'jeskai': 'URW', 'sultai': 'BGU', 'mardu': 'RWB', 'temur': 'GUR',
+}
+COLOR_ORDER = 'WUBRG'
+
+TOKEN_PATTERN = re.compile(r'''
+    \s*(?:
+        (?P<lparen>-?\() |
+        (?P<rparen>\)) |
+        (?P<term>
+            (?P<negate>-)?
+            (?:(?P<key>[a-z]+)(?P<op>!=|<=|>=|[:=<>]))?
+            (?:"(?P<quoted>[^"]*)"|(?P<bare>[^\s()"]+))
+        )
+    )
+''', re.VERBOSE | re.IGNORECASE)
+
+
+class QuerySyntaxError(ValueError):
+    """Raised when a card query cannot be parsed or names an unknown filter."""
+
+    def __init__(self, message: str, position: Optional[int] = None):
+        self.message = message
+        self.position = position
+        super().__init__(message if position is None else f"{message} (at position {position})")
+
+
+class Token(NamedTuple):
+    kind: str
+    position: int
+    negate: bool = False
+    key: Optional[str] = None
+    op: Optional[str] = None
+    value: str = ''
+
+
+def tokenize(query: str) -> List[Token]:
+    tokens = []
+    position = 0
+    query = query.rstrip()
+    while position < len(query):
+        match = TOKEN_PATTERN.match(query, position)
+        if not match or match.end() == position:
+            raise QuerySyntaxError('Unexpected character', position)
+        start = match.start(match.lastgroup)
+        if match.group('lparen'):
+            tokens.append(Token('lparen', start, match.group('lparen') == '-('))
+        elif match.group('rparen'):
+            tokens.append(Token('rparen', start))
+        else:
+            value = match.group('quoted') if match.group('quoted') is not None else match.group('bare')
+            key = match.group('key')
+            if key is None and match.group('quoted') is None and value.lower() in ('or', 'and'):
+                tokens.append(Token(value.lower(), start))
+            else:
+                tokens.append(Token('term', start, bool(match.group('negate')),
+                                    key.lower() if key else None, match.group('op'), value))
+        position = match.end()
+    return tokens
+
+
+def parse_number(token: Token) -> float:
+    try:
+        return float(token.value)
+    except ValueError:
+        raise QuerySyntaxError(f"'{token.key}' expects a number, got '{token.value}'", token.position)
+
+
+def compare(column, op: str, value):
+    if op in (':', '='):
+        return column == value
+    if op == '!=':
+        return column != value
+    if op == '<':
+        return column < value
+    if op == '<=':
+        return column <= value
+    if op == '>':
+        return column > value
+    return column >= value
+
+
+def parse_colors(token: Token) -> Tuple[str, ...]:
+    """Turn 'ug', 'izzet' or 'colorless' into sorted color letters (empty for colorless)."""
+    value = token.value.lower()
+    if value in ('c', 'colorless'):
+        return ()
+    letters = COLOR_NAMES.get(value, value).upper()
+    if any(letter not in COLOR_ORDER for letter in letters):
+        raise QuerySyntaxError(f"Invalid colors: '{token.value}'", token.position)
+    return tuple(sorted(set(letters), key=COLOR_ORDER.index))
+
+
+def color_filter(column, token: Token):
+    """
+    Compare a JSONB color array the way Scryfall does.
+
+    `:` and `>=` mean "includes all of these" and use the GIN index (@>);
+    `=` is an exact match, `<=` a subset. 'm'/'multicolor' matches two or more colors.
+    """
+    colors = func.coalesce(column, cast('[]', JSONB))
+    count = func.jsonb_array_length(colors)
+    if token.value.lower() in ('m', 'multicolor'):
+        return compare(count, '>=' if token.op == ':' else token.op, 2)
+
+    letters = list(parse_colors(token))
+    if not letters:
+        return compare(count, '=' if token.op == ':' else token.op, 0)
+
+    superset = column.contains(letters)
+    subset = colors.contained_by(letters)
+    if token.op in (':', '>='):
+        return superset
+    if token.op == '=':
+        return and_(superset, subset)
+    if token.op == '!=':
+        return not_(and_(superset, subset))
+    if token.op == '>':
+        return and_(superset, count > len(letters))
+    if token.op == '<=':
+        return subset
+    return and_(subset, count < len(letters))
+
+
+def rarity_filter(token: Token):
+    value = token.value.lower()
+    rarity = next((r for r in RARITIES if r == value or r[0] == value), None)
+    if rarity is None:
+        raise QuerySyntaxError(f"Unknown rarity: '{token.value}'", token.position)
+    if token.op in (':', '=', '!='):
+        return compare(Card.rarity, token.op, rarity)
+    index = RARITIES.index(rarity)
+    matching = [r for i, r in enumerate(RARITIES) if compare(i, token.op, index)]
+    return Card.rarity.in_(matching)
+
+
+def text_filter(column):
+    def build(token: Token):
+        if token.op not in (':', '='):
+            raise QuerySyntaxError(f"'{token.key}' only supports ':'", token.position)
+        return column.ilike(f'%{escape_like(token.value)}%', escape='\\')
+    return build
+
+
+def numeric_filter(column):
+    def build(token: Token):
+        return compare(column, token.op, parse_number(token))
+    return build
+
+
+def exact_filter(column, normalize: Callable[[str], str] = str.lower):
+    def build(token: Token):
+        if token.op not in (':', '=', '!='):
+            raise QuerySyntaxError(f"'{token.key}' only supports ':' and '!='", token.position)
+        return compare(column, token.op, normalize(token.value))
+    return build
+
+
+def keyword_filter(token: Token):
+    # Scryfall capitalizes only the first word of a keyword ("First strike")
+    return Card.keywords.contains([token.value.capitalize()])
+
+
+# Inventory counts
+OWNED = Card.quantity_regular + Card.quantity_foil
+KIOSK = Card.quantity_kiosk_regular + Card.quantity_kiosk_foil
+
+# Cache domains a query can read through the inventory filters above; routes
+# that accept one must be cached under all of them
+QUERY_DOMAINS = ('collection', 'kiosk')
+
+IS_FILTERS = {
+    'foil': Card.foil.is_(True),
+    'nonfoil': Card.nonfoil.is_(True),
+    'promo': Card.promo.is_(True),
+    'reprint': Card.reprint.is_(True),
+    'reserved': Card.reserved.is_(True),
+    'fullart': Card.full_art.is_(True),
+    'textless': Card.textless.is_(True),
+    'digital': Card.digital.is_(True),
+    'variation': Card.variation.is_(True),
+    'oversized': Card.oversized.is_(True),
+    'booster': Card.booster.is_(True),
+    'owned': OWNED > 0,
+    'missing': OWNED == 0,
+    'kiosk': KIOSK > 0,
+}
+
+
+def is_filter(token: Token):
+    condition = IS_FILTERS.get(token.value.lower())
+    if condition is None:
+        raise QuerySyntaxError(f"Unknown is: filter '{token.value}'", token.position)
+    return condition
+
+
+def not_filter(token: Token):
+    return not_(is_filter(token))
+
+
+FILTERS: Dict[str, Callable[[Token], object]] = {
+    'name': text_filter(Card.name),
+    't': text_filter(Card.type_line),
+    'type': text_filter(Card.type_line),
+    'o': text_filter(Card.oracle_text),
+    'oracle': text_filter(Card.oracle_text),
+    'a': text_filter(Card.artist),
+    'artist': text_filter(Card.artist),
+    'c': lambda token: color_filter(Card.colors, token),
+    'color': lambda token: color_filter(Card.colors, token),
+    'id': lambda token: color_filter(Card.color_identity, token),
+    'identity': lambda token: color_filter(Card.color_identity, token),
+    'cmc': numeric_filter(Card.cmc),
+    'mv': numeric_filter(Card.cmc),
+    'r': rarity_filter,
+    'rarity': rarity_filter,
+    's': exact_filter(Card.set_code),
+    'set': exact_filter(Card.set_code),
+    'e': exact_filter(Card.set_code),
+    'cn': exact_filter(Card.collector_number),
+    'number': exact_filter(Card.collector_number),
+    'k': keyword_filter,
+    'keyword': keyword_filter,
+    'usd': numeric_filter(Card.usd_price),
+    'usdfoil': numeric_filter(Card.usd_foil_price),
+    'year': numeric_filter(extract('year', Card.released_at)),
+    'owned': numeric_filter(OWNED),
+    'regular': numeric_filter(Card.quantity_regular),
+    'foils': numeric_filter(Card.quantity_foil),
+    'kiosk': numeric_filter(KIOSK),
+    'is': is_filter,
+    'not': not_filter,
+}
+
+
+class Parser:
+    """
+    Recursive-descent parser over the token list.
+
+        query   := clause (OR clause)*
+        clause  := unary ((AND)? unary)*
+        unary   := '-'? ( '(' query ')' | term )
+    """
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.index = 0
+
+    def peek(self) -> Optional[Token]:
+        return self.tokens[self.index] if self.index < len(self.tokens) else None
+
+    def advance(self) -> Token:
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def parse(self):
+        expression = self.parse_or()
+        token = self.peek()
+        if token is not None:
+            raise QuerySyntaxError(f"Unexpected '{token.kind}'", token.position)
+        return expression
+
+    def parse_or(self):
+        clauses = [self.parse_and()]
+        while self.peek() is not None and self.peek().kind == 'or':
+            self.advance()
+            clauses.append(self.parse_and())
+        return clauses[0] if len(clauses) == 1 else or_(*clauses)
+
+    def parse_and(self):
+        terms = [self.parse_unary()]
+        while self.peek() is not None and self.peek().kind in ('and', 'term', 'lparen'):
+            if self.peek().kind == 'and':
+                self.advance()
+            terms.append(self.parse_unary())
+        return terms[0] if len(terms) == 1 else and_(*terms)
+
+    def parse_unary(self):
+        token = self.peek()
+        if token is None:
+            raise QuerySyntaxError('Unexpected end of query')
+        if token.kind == 'lparen':
+            self.advance()
+            expression = self.parse_or()
+            closing = self.peek()
+            if closing is None or closing.kind != 'rparen':
+                raise QuerySyntaxError("Missing ')'", token.position)
+            self.advance()
+            return not_(expression) if token.negate else expression
+        if token.kind != 'term':
+            raise QuerySyntaxError(f"Unexpected '{token.kind}'", token.position)
+        self.advance()
+        expression = self.compile_term(token)
+        return not_(expression) if token.negate else expression
+
+    @staticmethod
+    def compile_term(token: Token):
+        if token.key is None:
+            # Bare words match card names, served by the trigram index
+            return Card.name.ilike(f'%{escape_like(token.value)}%', escape='\\')
+        build = FILTERS.get(token.key)
+        if build is None:
+            raise QuerySyntaxError(f"Unknown filter '{token.key}'", token.position)
+        return build(token)
+
+
+def compile_query(query: Optional[str]):
+    """
+    Compile a Scryfall-style card query into one SQLAlchemy filter expression.
+
+    Terms are ANDed unless joined by `or`; `-` negates a term and parentheses
+    group. For example `t:creature c>=ug cmc<=3 r:mythic is:foil owned>0 set:mh3`.
+    Filters compile to the indexed columns (cmc, rarity, set_code, colors GIN)
+    so the whole query runs in one round trip.
+
+    Args:
+        query (Optional[str]): The query text. Empty queries match every card.
+
+    Returns:
+        A SQLAlchemy boolean expression over Card columns.
+
+    Raises:
+        QuerySyntaxError: If the query is malformed or uses an unknown filter.
+    """
+    if not query or not query.strip():
+        return true()
+    return Parser(tokenize(query)).parse()
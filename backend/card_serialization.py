@@ -0,0 +1,126 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from statistics import median
+from time import perf_counter
+from sqlalchemy import select, func, literal, cast, text, Text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from database import db
+from models.card import Card
+from utils import orjson_default
+import orjson
+
+cards_table = Card.__table__
+
+# Collector-number order within a set, served by idx_cards_keyset
+SET_ORDER = (cards_table.c.collector_sort_key, cards_table.c.id)
+
+
+def card_columns(fields: Optional[Sequence[str]] = None, quantity_type: str = 'collection') -> List[Any]:
+    """
+    Core column expressions labeled with the keys Card.to_dict emits.
+
+    Args:
+        fields (Optional[Sequence[str]]): Keys from Card.parse_fields. Defaults to Card.FIELDS.
+        quantity_type (str): Which inventory the quantity keys report.
+
+    Returns:
+        List[Any]: One labeled column per key, in order.
+    """
+    quantity_columns = Card.QUANTITY_COLUMNS.get(quantity_type, {})
+    columns = []
+    for field in fields or Card.FIELDS:
+        if field in ('quantity_regular', 'quantity_foil'):
+            column = cards_table.c[quantity_columns[field]] if field in quantity_columns else literal(0)
+        elif field == 'image_uri_small':
+            column = cards_table.c.image_uris['small'].astext
+        else:
+            column = cards_table.c[field]
+        columns.append(column.label(field))
+    return columns
+
+
+def select_card_rows(where: Sequence[Any], fields: Optional[Sequence[str]] = None,
+                     quantity_type: str = 'collection') -> List[Dict[str, Any]]:
+    """
+    Fetch card dicts with a Core select, bypassing ORM hydration.
+
+    Produces the same keys as Card.to_dict without building Card objects,
+    the identity map or per-attribute instrumentation.
+    """
+    statement = select(*card_columns(fields, quantity_type)).where(*where).order_by(*SET_ORDER)
+    return [dict(row._mapping) for row in db.session.execute(statement)]
+
+
+def select_cards_json(where: Sequence[Any], fields: Optional[Sequence[str]] = None,
+                      quantity_type: str = 'collection') -> Tuple[bytes, int]:
+    """
+    Have Postgres build the JSON array of cards with json_agg.
+
+    The array arrives as one text value that is spliced into the response body
+    as is, so no per-card Python objects are created at all.
+
+    Returns:
+        Tuple[bytes, int]: The JSON array and the number of cards in it.
+    """
+    pairs = []
+    for column in card_columns(fields, quantity_type):
+        pairs.extend((literal(column.name), column.element))
+    cards_json = func.coalesce(
+        func.json_agg(aggregate_order_by(func.json_build_object(*pairs), *SET_ORDER)),
+        text("'[]'::json")
+    )
+    statement = select(func.count(), cast(cards_json, Text)).select_from(cards_table).where(*where)
+    total, body = db.session.execute(statement).one()
+    return body.encode(), total
+
+
+def json_object(*items: Tuple[str, Any]) -> bytes:
+    """
+    Assemble a JSON object from (key, value) pairs, where bytes values are
+    pre-serialized JSON spliced in verbatim and anything else goes through orjson.
+    """
+    parts = []
+    for key, value in items:
+        encoded = value if isinstance(value, bytes) else orjson.dumps(value, default=orjson_default)
+        parts.append(orjson.dumps(key) + b':' + encoded)
+    return b'{' + b','.join(parts) + b'}'
+
+
+def benchmark_set_serialization(set_code: str, runs: int = 20) -> Dict[str, Dict[str, float]]:
+    """
+    Time the ORM, Core and json_agg paths serializing one set's cards to JSON.
+
+    Each path runs once to warm up and then `runs` times; the ORM identity map
+    is cleared between runs so it cannot serve objects from an earlier run.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Per path, the median and best time in
+        milliseconds and the payload size.
+    """
+    where = [Card.set_code == set_code]
+
+    def orm_path() -> bytes:
+        cards = Card.query.filter(*where).order_by(Card.collector_sort_key, Card.id).all()
+        return orjson.dumps({'cards': [card.to_dict() for card in cards]}, default=orjson_default)
+
+    def core_path() -> bytes:
+        return orjson.dumps({'cards': select_card_rows(where)}, default=orjson_default)
+
+    def json_agg_path() -> bytes:
+        return json_object(('cards', select_cards_json(where)[0]))
+
+    paths: Dict[str, Callable[[], bytes]] = {'orm': orm_path, 'core': core_path, 'json_agg': json_agg_path}
+    results = {}
+    for name, path in paths.items():
+        body = path()
+        timings = []
+        for _ in range(runs):
+            db.session.expunge_all()
+            start_time = perf_counter()
+            path()
+            timings.append((perf_counter() - start_time) * 1000)
+        results[name] = {
+            'median_ms': round(median(timings), 2),
+            'best_ms': round(min(timings), 2),
+            'bytes': len(body),
+        }
+    return results
@@ -0,0 +1,255 @@
+from typing import Any, Dict, Iterable, Iterator, List
+from time import perf_counter
+from sqlalchemy.dialects.postgresql import insert
+from database import db
+from models.card import Card
+from models.set import Set
+import io
+import hashlib
+import itertools
+import orjson
+import logging
+
+try:
+    import ijson
+except ImportError:  # Only the catalog ingest CLI needs it
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+cards_table = Card.__table__
+
+# Inventory columns the catalog never writes
+INVENTORY_COLUMNS = ('quantity_regular', 'quantity_foil', 'quantity_kiosk_regular', 'quantity_kiosk_foil')
+
+# Card columns loaded from Scryfall, in staging-table order (generated columns are left to Postgres)
+CARD_COLUMNS = [
+    column.name for column in cards_table.columns
+    if column.computed is None and column.name not in INVENTORY_COLUMNS
+]
+
+# Columns fingerprinted separately, since prices change daily and the rest rarely does
+PRICE_COLUMNS = ('prices', 'usd_price', 'usd_foil_price')
+HASH_COLUMNS = ('content_hash', 'price_hash')
+CONTENT_COLUMNS = [column for column in CARD_COLUMNS if column not in PRICE_COLUMNS + HASH_COLUMNS]
+
+# Cache domains whose entries embed card data, bumped for the sets a refresh touched
+CATALOG_DOMAINS = ('catalog', 'collection', 'kiosk')
+
+# Scryfall keys whose column has a different name
+SCRYFALL_KEYS = {'set_code': 'set'}
+
+# Face-level fields that double-faced cards carry only on their faces
+FACE_FIELDS = {'mana_cost': ' // ', 'oracle_text': '\n//\n'}
+
+# Extra staging columns used to create sets that the bulk file references but the table lacks
+SET_STAGING_COLUMNS = ['set_id', 'set_type']
+
+STAGING_COLUMNS = CARD_COLUMNS + SET_STAGING_COLUMNS
+
+SET_COLUMNS = ['code', 'id', 'name', 'released_at', 'set_type', 'card_count', 'digital', 'foil_only', 'icon_svg_uri']
+
+
+def copy_value(value: Any) -> str:
+    """Encode one value for COPY ... FROM STDIN in text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (dict, list)):
+        value = orjson.dumps(value).decode()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def fingerprint(values: List[Any]) -> str:
+    return hashlib.blake2b(orjson.dumps(values, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
+
+
+def card_row(card: Dict[str, Any]) -> List[Any]:
+    """Map one Scryfall card object onto STAGING_COLUMNS, fingerprints included."""
+    faces = card.get('card_faces') or []
+    prices = card.get('prices') or {}
+    row = dict(card)
+    if not row.get('image_uris') and faces:
+        row['image_uris'] = faces[0].get('image_uris')
+    for field, separator in FACE_FIELDS.items():
+        if row.get(field) is None and faces:
+            row[field] = separator.join(face.get(field) or '' for face in faces)
+    row['usd_price'] = prices.get('usd')
+    row['usd_foil_price'] = prices.get('usd_foil')
+    values = {column: row.get(SCRYFALL_KEYS.get(column, column)) for column in STAGING_COLUMNS}
+    values['content_hash'] = fingerprint([values[column] for column in CONTENT_COLUMNS])
+    values['price_hash'] = fingerprint([values[column] for column in PRICE_COLUMNS])
+    return [values[column] for column in STAGING_COLUMNS]
+
+
+def read_bulk_cards(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the card objects of a Scryfall bulk data file one at a time.
+
+    The file is a single top-level JSON array; ijson parses it incrementally,
+    so memory does not grow with the file size.
+    """
+    if ijson is None:
+        raise RuntimeError("The ijson package is required to read Scryfall bulk data.")
+    with open(path, 'rb') as bulk_file:
+        yield from ijson.items(bulk_file, 'item', use_float=True)
+
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def upsert_statements() -> Dict[str, str]:
+    """
+    The SQL that moves one staged batch into sets and cards.
+
+    Cards whose fingerprints match the staged ones are not written at all.
+    Cards whose prices alone changed get a narrow UPDATE of the price columns,
+    which leaves every indexed column alone and so can be a HOT update. Only
+    new cards and cards whose other content changed are fully rewritten.
+    """
+    columns = ', '.join(CARD_COLUMNS)
+    updates = ', '.join(f'{column} = excluded.{column}' for column in CARD_COLUMNS if column != 'id')
+    price_updates = ', '.join(f'{column} = s.{column}' for column in PRICE_COLUMNS + ('price_hash',))
+    inventory_columns = ', '.join(INVENTORY_COLUMNS)
+    inventory_defaults = ', '.join('0' for _ in INVENTORY_COLUMNS)
+    return {
+        # Sets the bulk file references but the table does not know yet; load_sets fills in the rest
+        'sets': '''
+            INSERT INTO sets (code, id, name, set_type, released_at, digital)
+            -- id and name are NOT NULL; the set code stands in when the cards lack them
+            SELECT set_code, coalesce(min(set_id), set_code), coalesce(min(set_name), set_code),
+                   min(set_type), min(released_at), bool_and(digital)
+            FROM card_staging
+            WHERE set_code IS NOT NULL
+            GROUP BY set_code
+            ON CONFLICT (code) DO NOTHING
+        ''',
+        'prices': f'''
+            UPDATE cards SET {price_updates}
+            FROM card_staging s
+            WHERE cards.id = s.id
+              AND cards.content_hash = s.content_hash
+              AND cards.price_hash IS DISTINCT FROM s.price_hash
+            RETURNING cards.set_code
+        ''',
+        # Quantities are only set (to zero) for new cards and never touched on existing ones
+        'cards': f'''
+            INSERT INTO cards ({columns}, {inventory_columns})
+            SELECT DISTINCT ON (id) {columns}, {inventory_defaults}
+            FROM card_staging
+            ORDER BY id
+            ON CONFLICT (id) DO UPDATE SET {updates}
+            WHERE cards.content_hash IS DISTINCT FROM excluded.content_hash
+            RETURNING cards.set_code, (xmax = 0) AS inserted
+        ''',
+    }
+
+
+def ingest_cards(path: str, batch_size: int) -> Dict[str, Any]:
+    """
+    Load a Scryfall bulk card file (default_cards, all_cards, ...) into the catalog.
+
+    Cards are streamed from the file, fingerprinted, COPYed into a staging
+    table `batch_size` at a time and merged by upsert_statements, each batch in
+    its own transaction, so only changed cards are written. Missing sets are
+    created from the card data. Inventory quantities are never modified.
+
+    Args:
+        path (str): Path to the bulk JSON file.
+        batch_size (int): Cards per COPY and upsert.
+
+    Returns:
+        Dict[str, Any]: Cards read, inserted, rewritten, price-updated and
+        unchanged, the set codes of every written card, batches and elapsed time.
+    """
+    start_time = perf_counter()
+    columns = ', '.join(STAGING_COLUMNS)
+    statements = upsert_statements()
+    cards = inserted = updated = price_updated = 0
+    batches = 0
+    set_codes = set()
+
+    with db.engine.connect() as connection:
+        dbapi_connection = connection.connection
+        cursor = dbapi_connection.cursor()
+        try:
+            # Temp tables outlive the transaction on this pooled session, so start from a clean slate
+            cursor.execute('DROP TABLE IF EXISTS card_staging')
+            cursor.execute(f'''
+                CREATE TEMP TABLE card_staging ON COMMIT DELETE ROWS AS
+                SELECT {', '.join(CARD_COLUMNS)}, NULL::text AS set_id, NULL::text AS set_type
+                FROM cards WITH NO DATA
+            ''')
+            dbapi_connection.commit()
+
+            for batch in batched(read_bulk_cards(path), batch_size):
+                batch_start = perf_counter()
+                buffer = io.StringIO()
+                for card in batch:
+                    buffer.write('\t'.join(copy_value(value) for value in card_row(card)))
+                    buffer.write('\n')
+                buffer.seek(0)
+
+                cursor.copy_expert(f'COPY card_staging ({columns}) FROM STDIN', buffer)
+                cursor.execute(statements['sets'])
+                cursor.execute(statements['prices'])
+                repriced = cursor.fetchall()
+                cursor.execute(statements['cards'])
+                written = cursor.fetchall()
+                dbapi_connection.commit()
+
+                price_updated += len(repriced)
+                inserted += sum(1 for _, is_new in written if is_new)
+                updated += sum(1 for _, is_new in written if not is_new)
+                set_codes.update(set_code for set_code, *_ in repriced + written if set_code)
+
+                cards += len(batch)
+                batches += 1
+                elapsed = perf_counter() - batch_start
+                logger.info(f"Catalog batch {batches}: {len(batch)} cards in {elapsed:.2f}s "
+                            f"({len(batch) / elapsed:.0f} cards/s, {cards} total)")
+        except Exception:
+            dbapi_connection.rollback()
+            raise
+        finally:
+            # Leave nothing behind on the connection for its next user
+            cursor.execute('DROP TABLE IF EXISTS card_staging')
+            dbapi_connection.commit()
+            cursor.close()
+
+    return {
+        'cards': cards,
+        'inserted': inserted,
+        'updated': updated,
+        'price_updated': price_updated,
+        'unchanged': cards - inserted - updated - price_updated,
+        'set_codes': sorted(set_codes),
+        'batches': batches,
+        'elapsed_seconds': round(perf_counter() - start_time, 2),
+    }
+
+
+def load_sets(path: str) -> int:
+    """
+    Upsert every set from a saved Scryfall /sets response (a JSON object with a `data` list).
+
+    Returns:
+        int: The number of sets loaded.
+    """
+    with open(path, 'rb') as sets_file:
+        sets = orjson.loads(sets_file.read())['data']
+    rows = [{column: scryfall_set.get(column) for column in SET_COLUMNS} for scryfall_set in sets]
+    if not rows:
+        return 0
+    statement = insert(Set.__table__).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=['code'],
+        set_={column: statement.excluded[column] for column in SET_COLUMNS if column != 'code'}
+    )
+    db.session.execute(statement)
+    db.session.commit()
+    return len(rows)
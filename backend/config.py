@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables from the .env file
@@ -20,6 +21,60 @@ class Config:
     REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
     REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
     REDIS_DB = int(os.getenv('REDIS_DB', 0))
+    REDIS_CONNECT_TIMEOUT = float(os.getenv('REDIS_CONNECT_TIMEOUT', 0.25))
+    REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 0.25))
+
+    # Consecutive Redis failures that open the circuit, and seconds before a retry
+    CACHE_BREAKER_FAILURE_THRESHOLD = int(os.getenv('CACHE_BREAKER_FAILURE_THRESHOLD', 5))
+    CACHE_BREAKER_RESET_TIMEOUT = float(os.getenv('CACHE_BREAKER_RESET_TIMEOUT', 30))
+
+    # Cache configuration (entries are invalidated by generation counters, so TTLs can be long)
+    CACHE_DEFAULT_TIMEOUT = int(os.getenv('CACHE_DEFAULT_TIMEOUT', 3600))
+    # Stale entries are served for this many seconds past their soft TTL while one worker refreshes them
+    CACHE_STALE_GRACE = int(os.getenv('CACHE_STALE_GRACE', 600))
+    # Single-flight recomputation lock and how long waiters poll for the winner's result
+    CACHE_LOCK_TIMEOUT = int(os.getenv('CACHE_LOCK_TIMEOUT', 30))
+    CACHE_LOCK_WAIT = float(os.getenv('CACHE_LOCK_WAIT', 2.0))
+    # Cached bodies at least this large are stored compressed ('gzip', 'zstd' or 'none')
+    CACHE_COMPRESSION = os.getenv('CACHE_COMPRESSION', 'gzip').lower()
+    CACHE_COMPRESS_MIN_BYTES = int(os.getenv('CACHE_COMPRESS_MIN_BYTES', 16 * 1024))
+    # Requests slower than this are kept in a bounded window for /api/cache_stats
+    CACHE_SLOW_REQUEST_MS = int(os.getenv('CACHE_SLOW_REQUEST_MS', 500))
+    CACHE_SLOW_REQUEST_WINDOW = int(os.getenv('CACHE_SLOW_REQUEST_WINDOW', 100))
+    # Request metrics are buffered per process and flushed to Redis this often
+    CACHE_METRICS_FLUSH_INTERVAL = float(os.getenv('CACHE_METRICS_FLUSH_INTERVAL', 5))
+    # Cache warming after imports and from `flask warm-cache`
+    CACHE_WARM_CONCURRENCY = int(os.getenv('CACHE_WARM_CONCURRENCY', 4))
+    CACHE_WARM_AFTER_IMPORT = os.getenv('CACHE_WARM_AFTER_IMPORT', 'True').lower() in ('true', '1', 't')
+
+    # /api/cards/bulk limits
+    BULK_CARDS_MAX_IDS = int(os.getenv('BULK_CARDS_MAX_IDS', 10000))
+    BULK_CARDS_DB_CHUNK_SIZE = int(os.getenv('BULK_CARDS_DB_CHUNK_SIZE', 1000))
+
+    # Listing totals: exact counts are cached per filter signature; count=estimate
+    # still counts exactly when the planner expects fewer rows than this
+    COUNT_CACHE_TIMEOUT = int(os.getenv('COUNT_CACHE_TIMEOUT', 3600))
+    COUNT_EXACT_BELOW_ESTIMATE = int(os.getenv('COUNT_EXACT_BELOW_ESTIMATE', 10000))
+
+    # Cards fetched per server-side cursor round trip by the inventory exports
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+
+    # Background CSV imports: uploads wait in this directory for one of the worker threads
+    IMPORT_UPLOAD_DIR = os.getenv('IMPORT_UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'mtg-imports'))
+    IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', 2))
+    # Running imports without progress for this many seconds are failed as orphaned
+    IMPORT_STALE_AFTER = int(os.getenv('IMPORT_STALE_AFTER', 1800))
+    # Rows parsed, validated and committed per batch, and row errors kept for the report
+    IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 50000))
+    IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', 1000))
+
+    # Cards per COPY and upsert batch in `flask ingest-scryfall`
+    CATALOG_INGEST_BATCH_SIZE = int(os.getenv('CATALOG_INGEST_BATCH_SIZE', 20000))
+
+    # Per-worker in-memory tier used by routes decorated with cache_response(local=True)
+    CACHE_LOCAL_ENABLED = os.getenv('CACHE_LOCAL_ENABLED', 'True').lower() in ('true', '1', 't')
+    CACHE_LOCAL_MAX_BYTES = int(os.getenv('CACHE_LOCAL_MAX_BYTES', 64 * 1024 * 1024))
+    CACHE_LOCAL_GENERATION_TTL = int(os.getenv('CACHE_LOCAL_GENERATION_TTL', 30))
 
     # Debug settings
     DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() in ('true', '1', 't')
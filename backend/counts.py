@@ -0,0 +1,138 @@
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from flask import current_app
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from redis.exceptions import RedisError
+from database import db
+from cache import versioned_key
+import hashlib
+import orjson
+import logging
+
+logger = logging.getLogger(__name__)
+
+COUNT_PREFIX = 'count:'
+
+# exact: COUNT(*), cached per filter signature. estimate: the planner's row
+# estimate. none: skip the total and only report whether a next page exists.
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) wrapper that keeps the wrapped statement's bind parameters."""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, 'postgresql')
+def compile_explain(element, compiler, **kw):
+    return f"EXPLAIN (FORMAT JSON) {compiler.process(element.statement, **kw)}"
+
+
+class CountedPage(NamedTuple):
+    items: List[Any]
+    total: Optional[int]
+    total_exact: bool
+    page: int
+    per_page: int
+    has_next: bool
+
+    def meta(self) -> Dict[str, Any]:
+        """Pagination fields for the response body."""
+        pages = (self.total + self.per_page - 1) // self.per_page if self.total is not None else None
+        return {
+            'total': self.total,
+            'total_exact': self.total_exact,
+            'pages': pages,
+            'current_page': self.page,
+            'has_next': self.has_next,
+        }
+
+
+def count_signature(query) -> str:
+    """Hash the compiled SQL and bound parameters that identify a filtered listing."""
+    compiled = query.order_by(None).statement.compile(dialect=postgresql.dialect())
+    params = orjson.dumps(compiled.params, default=str, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(str(compiled).encode() + params, digest_size=16).hexdigest()
+
+
+def exact_count(query, domains: Iterable[str]) -> int:
+    """
+    COUNT(*) a query, caching the result per filter signature.
+
+    The key is versioned by the inventory domains' generations, so inventory
+    writes (which bump them through invalidate_cache) retire every cached count.
+    Redis failures fall back to counting in the database.
+    """
+    try:
+        cache_key = versioned_key(f"{COUNT_PREFIX}{count_signature(query)}", domains)
+        cached = current_app.redis_client.get(cache_key)
+        if cached is not None:
+            return int(cached)
+    except RedisError as e:
+        logger.warning(f"Count cache unavailable: {str(e)}")
+        cache_key = None
+
+    total = query.order_by(None).count()
+    if cache_key:
+        try:
+            current_app.redis_client.set(cache_key, total, ex=current_app.config['COUNT_CACHE_TIMEOUT'])
+        except RedisError as e:
+            logger.warning(f"Failed to cache count for {cache_key}: {str(e)}")
+    return total
+
+
+def estimate_count(query) -> int:
+    """Read the planner's row estimate for a query without executing it."""
+    plan = db.session.execute(Explain(query.order_by(None).statement)).scalar()
+    if isinstance(plan, (str, bytes)):
+        plan = orjson.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_total(query, mode: str, domains: Iterable[str]) -> Tuple[Optional[int], bool]:
+    """
+    Resolve the total for a listing in the requested mode.
+
+    In estimate mode, results the planner expects to be small are counted
+    exactly anyway, since that is cheap and the estimate is least reliable there.
+
+    Returns:
+        Tuple[Optional[int], bool]: The total (None in 'none' mode) and whether it is exact.
+    """
+    if mode == 'none':
+        return None, False
+    if mode == 'estimate':
+        estimate = estimate_count(query)
+        if estimate >= current_app.config['COUNT_EXACT_BELOW_ESTIMATE']:
+            return estimate, False
+    return exact_count(query, domains), True
+
+
+def paginate_counted(query, page: int, per_page: int, mode: str, domains: Iterable[str]) -> CountedPage:
+    """
+    Offset-paginate a query with the total resolved by count_total.
+
+    One extra row is fetched so has_next is known even when no total is computed.
+
+    Args:
+        query: The filtered listing query.
+        page (int): 1-based page number.
+        per_page (int): Page size.
+        mode (str): One of COUNT_MODES.
+        domains (Iterable[str]): Inventory domains the listing reads, for count caching.
+
+    Returns:
+        CountedPage: The rows on the page and the pagination metadata.
+    """
+    page = max(page, 1)
+    rows = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+    if len(rows) <= per_page and (rows or page == 1):
+        # The last page tells us the exact total for free
+        total, total_exact = (page - 1) * per_page + len(rows), True
+    else:
+        total, total_exact = count_total(query, mode, domains)
+    return CountedPage(rows[:per_page], total, total_exact, page, per_page, len(rows) > per_page)
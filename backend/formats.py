@@ -0,0 +1,75 @@
+from typing import Any, Dict, Iterable, Optional
+from flask import request
+import msgpack
+import orjson
+import pyarrow
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+# The list of records that becomes the rows of an Arrow table
+ARROW_RECORDS_KEY = 'cards'
+
+
+def negotiate_format(formats: Iterable[str]) -> Optional[str]:
+    """
+    Pick the response format from the Accept header.
+
+    JSON is listed first so it wins for */* and for clients that send no Accept.
+
+    Args:
+        formats (Iterable[str]): Binary mimetypes the route can be served in.
+
+    Returns:
+        Optional[str]: The chosen mimetype, or None when the client accepts
+        none of the formats the route offers.
+    """
+    formats = list(formats)
+    if not formats or not request.accept_mimetypes:
+        return JSON_MIMETYPE
+    return request.accept_mimetypes.best_match([JSON_MIMETYPE] + formats)
+
+
+def encode_msgpack(data: Any) -> bytes:
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def arrow_value(value: Any) -> Any:
+    # Nested JSONB documents vary in shape from card to card, so they travel as JSON text
+    if isinstance(value, (dict, list)):
+        return orjson.dumps(value).decode()
+    return value
+
+
+def encode_arrow(data: Dict[str, Any]) -> bytes:
+    """
+    Encode a response as an Arrow IPC stream in a columnar layout.
+
+    The records under ARROW_RECORDS_KEY become the table rows. Every other
+    top-level value (totals, cursors, set details) goes into the schema
+    metadata as JSON.
+    """
+    records = data.get(ARROW_RECORDS_KEY) or []
+    table = pyarrow.Table.from_pylist([
+        {key: arrow_value(value) for key, value in record.items()} for record in records
+    ])
+    metadata = {key: orjson.dumps(value) for key, value in data.items() if key != ARROW_RECORDS_KEY}
+    table = table.replace_schema_metadata(metadata)
+
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def transcode(body: bytes, mimetype: str) -> bytes:
+    """Re-encode a serialized JSON body in the negotiated format."""
+    if mimetype == JSON_MIMETYPE:
+        return body
+    data = orjson.loads(body)
+    if mimetype == MSGPACK_MIMETYPE:
+        return encode_msgpack(data)
+    if mimetype == ARROW_MIMETYPE:
+        return encode_arrow(data)
+    raise ValueError(f"Unsupported response format: {mimetype}")
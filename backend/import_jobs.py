@@ -0,0 +1,233 @@
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from time import perf_counter
+from flask import current_app
+from sqlalchemy import text
+from database import db
+from models.import_record import ImportRecord
+from cache import invalidate_cache
+from warming import warm_cache_in_background
+from inventory_import import ImportTotals, read_import_chunks, import_inventory, revert_quantities
+import os
+import uuid
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+
+def init_import_workers(app) -> None:
+    """Attach the per-process pool (and its local job queue) that applies CSV imports."""
+    app.import_executor = ThreadPoolExecutor(
+        max_workers=app.config['IMPORT_WORKERS'],
+        thread_name_prefix='import-worker'
+    )
+
+
+class DuplicateImportError(Exception):
+    """Raised when an uploaded file has already been imported into the same inventory."""
+
+    def __init__(self, existing: ImportRecord):
+        super().__init__(f"This file was already imported as {existing.id}")
+        self.existing = existing
+
+
+class ImportStateError(ValueError):
+    """Raised when an import is asked to do something its status does not allow."""
+
+
+def save_upload(file, upload_path: str) -> str:
+    """Write an uploaded file to disk, returning the SHA-256 of its contents."""
+    digest = hashlib.sha256()
+    with open(upload_path, 'wb') as out:
+        for block in iter(lambda: file.stream.read(UPLOAD_BLOCK_SIZE), b''):
+            digest.update(block)
+            out.write(block)
+    return digest.hexdigest()
+
+
+def enqueue_import(file, inventory: str, force: bool = False) -> ImportRecord:
+    """
+    Store an uploaded CSV and queue it for a background worker.
+
+    Args:
+        file: The uploaded file.
+        inventory (str): 'collection' or 'kiosk'.
+        force (bool): Import the file even if the same content was imported before.
+
+    Returns:
+        ImportRecord: The queued job, which the worker keeps up to date.
+
+    Raises:
+        DuplicateImportError: If the same file is already applied (or queued) and force is off.
+    """
+    import_id = uuid.uuid4().hex
+    upload_dir = current_app.config['IMPORT_UPLOAD_DIR']
+    os.makedirs(upload_dir, exist_ok=True)
+    upload_path = os.path.join(upload_dir, f'{import_id}.csv')
+    content_hash = save_upload(file, upload_path)
+
+    # Jobs orphaned by a dead worker must not block re-uploading their file
+    expire_stale_imports()
+
+    # Serialize uploads of the same content so two of them cannot both pass the check
+    db.session.execute(text('SELECT pg_advisory_xact_lock(hashtext(:content_hash))'), {'content_hash': content_hash})
+    existing = None if force else ImportRecord.find_duplicate(content_hash, inventory)
+    if existing is not None:
+        db.session.rollback()
+        remove_upload(upload_path)
+        raise DuplicateImportError(existing)
+
+    record = ImportRecord(
+        id=import_id,
+        inventory=inventory,
+        filename=file.filename,
+        content_hash=content_hash,
+        upload_path=upload_path,
+        status=ImportRecord.QUEUED,
+        rows_processed=0,
+        rows_failed=0
+    )
+    db.session.add(record)
+    db.session.commit()
+
+    current_app.import_executor.submit(run_import, current_app._get_current_object(), import_id)
+    logger.info(f"Queued {inventory} import {import_id} ({file.filename})")
+    return record
+
+
+def expire_stale_imports() -> None:
+    """Fail running imports whose worker stopped, so clients stop polling them."""
+    stale = ImportRecord.fail_stale(current_app.config['IMPORT_STALE_AFTER'])
+    if stale:
+        logger.warning(f"Marked {stale} stale imports as failed")
+
+
+def run_import(app, import_id: str) -> None:
+    """Apply a queued import on a worker thread, recording its progress and outcome."""
+    with app.app_context():
+        record = db.session.get(ImportRecord, import_id)
+        if record is None:
+            return
+        if record.status != ImportRecord.QUEUED:
+            remove_upload(record.upload_path)
+            return
+        record.status = ImportRecord.RUNNING
+        record.started_at = datetime.utcnow()
+        db.session.commit()
+
+        try:
+            totals = ImportTotals(app.config['IMPORT_MAX_ERRORS'])
+            chunks = read_import_chunks(record.upload_path, app.config['IMPORT_CHUNK_SIZE'])
+            for df in chunks:
+                chunk_start = perf_counter()
+                result = import_inventory(df, record.inventory, import_id)
+                chunk = totals.add(result, perf_counter() - chunk_start)
+                if not still_running(record):
+                    # Failed elsewhere meanwhile; this chunk is not applied
+                    db.session.rollback()
+                    break
+                record.rows_processed = totals.imported_rows
+                record.rows_failed = totals.error_count
+                record.summary = totals.to_dict()
+                # Each chunk's quantity UPDATE commits together with the progress it reports
+                db.session.commit()
+                logger.info(f"Import {import_id} chunk {chunk['chunk']}: {chunk['rows']} rows "
+                            f"in {chunk['seconds']}s ({chunk['rows_per_second']} rows/s)")
+
+            if still_running(record):
+                record.rows_total = totals.rows
+                record.finished_at = datetime.utcnow()
+                if totals.imported_rows == 0 and totals.error_count:
+                    record.status = ImportRecord.FAILED
+                    record.error = 'No valid rows to import'
+                else:
+                    record.status = ImportRecord.COMPLETED
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.exception(f"Import {import_id} failed: {str(e)}")
+            # Chunks committed before the failure stay applied and are listed in the summary
+            record = db.session.get(ImportRecord, import_id)
+            if still_running(record):
+                record.status = ImportRecord.FAILED
+                record.error = str(e)
+                record.finished_at = datetime.utcnow()
+            db.session.commit()
+        finally:
+            remove_upload(record.upload_path)
+
+        logger.info(f"Import {import_id} {record.status} in {record.elapsed_seconds}s: "
+                    f"{record.rows_processed} rows imported, {record.rows_failed} failed")
+        if totals.card_updates:
+            after_import(app, record.inventory, totals.card_updates, totals.touched_set_codes)
+
+
+def still_running(record: ImportRecord) -> bool:
+    """
+    Re-read a job's status under a row lock, so its worker never overwrites
+    a status set elsewhere meanwhile (e.g. by expire_stale_imports).
+
+    Discards unflushed changes to the record, so call it before making them.
+    The lock is held until the caller commits.
+    """
+    db.session.refresh(record, with_for_update=True)
+    if record.status == ImportRecord.RUNNING:
+        return True
+    logger.warning(f"Import {record.id} is {record.status}; its worker stops here")
+    return False
+
+
+def undo_import(import_id: str) -> Optional[ImportRecord]:
+    """
+    Reverse exactly the quantities a finished import added, in one set-based UPDATE.
+
+    Works for failed imports too, reversing the chunks they committed.
+
+    Returns:
+        Optional[ImportRecord]: The undone import, or None if there is no such import.
+
+    Raises:
+        ImportStateError: If the import is still pending or was already undone.
+    """
+    record = db.session.get(ImportRecord, import_id, with_for_update=True)
+    if record is None:
+        return None
+    if record.status not in ImportRecord.FINISHED_STATUSES:
+        db.session.rollback()
+        raise ImportStateError(f"Import is {record.status} and cannot be undone")
+
+    updated_cards, set_codes = revert_quantities(record.inventory, record.id)
+    record.status = ImportRecord.UNDONE
+    record.undone_at = datetime.utcnow()
+    db.session.commit()
+    logger.info(f"Undid import {import_id}: {updated_cards} cards reverted")
+
+    after_import(current_app._get_current_object(), record.inventory, updated_cards, set_codes)
+    return record
+
+
+def after_import(app, inventory: str, updated_cards: int, set_codes) -> None:
+    """Refresh the derived views and caches an import invalidated."""
+    try:
+        # Refresh the set collection counts
+        if inventory == 'collection' and updated_cards:
+            from models.set_collection_count import SetCollectionCount
+            SetCollectionCount.refresh()
+
+        # Invalidate related caches
+        invalidate_cache(inventory, set_codes=set_codes)
+        if app.config['CACHE_WARM_AFTER_IMPORT']:
+            warm_cache_in_background(app, set_codes)
+    except Exception as e:
+        logger.exception(f"Post-import refresh failed for {inventory}: {str(e)}")
+
+
+def remove_upload(upload_path: str) -> None:
+    try:
+        os.remove(upload_path)
+    except OSError as e:
+        logger.warning(f"Could not remove import upload {upload_path}: {str(e)}")
@@ -0,0 +1,281 @@
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from sqlalchemy import text
+from database import db
+from models.card import Card
+import pandas as pd
+import io
+
+# Column layout of inventory CSVs (Manabox-style), shared with the exports
+CSV_COLUMNS = [
+    'Name', 'Edition', 'Edition code', "Collector's number",
+    'Price', 'Foil', 'Currency', 'Scryfall ID', 'Quantity'
+]
+
+# The columns an import reads, and the narrow dtypes they are parsed with;
+# Foil has a handful of distinct spellings, so it is stored as a category
+IMPORT_COLUMNS = ['Scryfall ID', 'Name', 'Foil', 'Quantity']
+IMPORT_DTYPES = {'Scryfall ID': 'string', 'Name': 'string', 'Foil': 'category', 'Quantity': 'string'}
+
+# Accepted spellings of the Foil column; blank cells count as non-foil
+FOIL_VALUES = {
+    'true': True, 'false': False, 'foil': True, 'etched': True, 'normal': False,
+    'yes': True, 'no': False, '1': True, '0': False, '': False, 'nan': False,
+}
+
+# CSV row numbers are 1-based and the header is row 1
+ROW_OFFSET = 2
+
+
+class ImportResult(NamedTuple):
+    rows: int
+    imported_rows: int
+    updated_cards: int
+    touched_set_codes: List[str]
+    errors: List[Dict[str, Any]]
+
+
+class ImportTotals:
+    """
+    Running totals of a chunked import.
+
+    Only the first `max_errors` row errors are kept, so the report stays small
+    however many rows fail; error_count still counts every one.
+    """
+
+    def __init__(self, max_errors: int):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.imported_rows = 0
+        self.card_updates = 0
+        self.touched_set_codes = set()
+        self.errors = []
+        self.error_count = 0
+        self.chunks = []
+
+    def add(self, result: ImportResult, elapsed_seconds: float) -> Dict[str, Any]:
+        """Fold in one chunk's result and return its throughput entry."""
+        self.rows += result.rows
+        self.imported_rows += result.imported_rows
+        self.card_updates += result.updated_cards
+        self.touched_set_codes.update(result.touched_set_codes)
+        self.errors.extend(result.errors[:self.max_errors - len(self.errors)])
+        self.error_count += len(result.errors)
+        chunk = {
+            'chunk': len(self.chunks) + 1,
+            'rows': result.rows,
+            'seconds': round(elapsed_seconds, 3),
+            'rows_per_second': round(result.rows / elapsed_seconds) if elapsed_seconds else None,
+        }
+        self.chunks.append(chunk)
+        return chunk
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'rows': self.rows,
+            'imported_rows': self.imported_rows,
+            'card_updates': self.card_updates,
+            'error_count': self.error_count,
+            'errors_truncated': self.error_count > len(self.errors),
+            'errors': self.errors,
+            'chunks': self.chunks,
+        }
+
+
+def check_import_header(file) -> None:
+    """
+    Check that an uploaded inventory CSV has the required columns, reading only its header.
+
+    Raises:
+        ValueError: If the header cannot be parsed or lacks a required column.
+    """
+    try:
+        columns = pd.read_csv(file, nrows=0).columns
+    except Exception as e:
+        raise ValueError(f"Failed to parse CSV: {str(e)}")
+    missing = set(CSV_COLUMNS) - set(columns)
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+
+
+def read_import_chunks(file, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Stream an inventory CSV as DataFrames of at most `chunk_size` rows.
+
+    Only IMPORT_COLUMNS are parsed, with narrow dtypes, so memory is bounded by
+    the chunk size rather than the file size. Chunk indexes continue across
+    chunks, so row numbers in error reports stay file-relative.
+
+    Raises:
+        ValueError: If the CSV cannot be parsed (pandas parser errors are ValueErrors too).
+    """
+    try:
+        reader = pd.read_csv(file, usecols=IMPORT_COLUMNS, dtype=IMPORT_DTYPES, chunksize=chunk_size)
+    except Exception as e:
+        raise ValueError(f"Failed to parse CSV: {str(e)}")
+    with reader:
+        yield from reader
+
+
+def row_errors(df: pd.DataFrame, mask: pd.Series, message: str) -> List[Dict[str, Any]]:
+    """One error report entry per row selected by `mask`."""
+    rows = df.loc[mask, ['Scryfall ID', 'Name']]
+    return [
+        {'row': int(index) + ROW_OFFSET, 'scryfall_id': scryfall_id if pd.notna(scryfall_id) else None,
+         'name': name if pd.notna(name) else None, 'error': message}
+        for index, scryfall_id, name in rows.itertuples()
+    ]
+
+
+def validate_rows(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """
+    Validate every row at once.
+
+    Returns:
+        Tuple[pd.DataFrame, List[Dict[str, Any]]]: The valid rows as `id`, `foil`
+        and `quantity` columns (indexed like `df`), and the errors of the rest.
+    """
+    ids = df['Scryfall ID'].astype('string').str.strip()
+    quantity = pd.to_numeric(df['Quantity'], errors='coerce')
+    foil = df['Foil'].astype(str).str.strip().str.lower().map(FOIL_VALUES)
+
+    bad_id = ids.isna() | (ids == '')
+    bad_quantity = ~bad_id & (quantity.isna() | (quantity < 1) | (quantity % 1 != 0))
+    bad_foil = ~bad_id & ~bad_quantity & foil.isna()
+
+    errors = (
+        row_errors(df, bad_id, 'Missing Scryfall ID.')
+        + row_errors(df, bad_quantity, 'Quantity must be a whole number of at least 1.')
+        + row_errors(df, bad_foil, 'Unrecognized Foil value.')
+    )
+    valid = ~(bad_id | bad_quantity | bad_foil)
+    rows = pd.DataFrame({
+        'id': ids[valid],
+        'foil': foil[valid].astype(bool),
+        'quantity': quantity[valid].astype('int64'),
+    })
+    return rows, errors
+
+
+def aggregate_rows(rows: pd.DataFrame) -> pd.DataFrame:
+    """Sum duplicate (Scryfall ID, foil) rows into one `id`, `regular`, `foil` row per card."""
+    totals = rows.groupby(['id', 'foil'])['quantity'].sum().unstack('foil', fill_value=0)
+    return pd.DataFrame({
+        'id': totals.index,
+        'regular': totals[False].values if False in totals.columns else 0,
+        'foil': totals[True].values if True in totals.columns else 0,
+    })
+
+
+def copy_into_temp_table(quantities: pd.DataFrame) -> None:
+    """COPY the aggregated quantities into a transaction-scoped temp table."""
+    db.session.execute(text(
+        'CREATE TEMP TABLE inventory_import (id text PRIMARY KEY, regular bigint, foil bigint) ON COMMIT DROP'
+    ))
+    buffer = io.StringIO()
+    quantities.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert('COPY inventory_import (id, regular, foil) FROM STDIN WITH (FORMAT csv)', buffer)
+    finally:
+        cursor.close()
+
+
+def quantity_columns(inventory: str) -> Tuple[str, str]:
+    columns = Card.QUANTITY_COLUMNS[inventory]
+    return columns['quantity_regular'], columns['quantity_foil']
+
+
+def apply_quantities(inventory: str, import_id: Optional[str] = None) -> Tuple[int, List[str], List[str]]:
+    """
+    Add the staged quantities to the inventory in one UPDATE ... FROM.
+
+    With an import_id, the same statement also adds what it applied to that
+    import's rows in import_deltas, so the deltas can never disagree with the cards.
+
+    Returns:
+        Tuple[int, List[str], List[str]]: The number of cards updated, their
+        set codes, and the staged IDs that match no card.
+    """
+    regular_column, foil_column = quantity_columns(inventory)
+    unknown_ids = [card_id for (card_id,) in db.session.execute(text(
+        'SELECT i.id FROM inventory_import i LEFT JOIN cards c ON c.id = i.id WHERE c.id IS NULL'
+    ))]
+    update = f'''
+        UPDATE cards
+        SET {regular_column} = COALESCE(cards.{regular_column}, 0) + i.regular,
+            {foil_column} = COALESCE(cards.{foil_column}, 0) + i.foil
+        FROM inventory_import i
+        WHERE cards.id = i.id
+        RETURNING cards.id, cards.set_code, i.regular, i.foil
+    '''
+    if import_id is None:
+        statement = text(f'WITH applied AS ({update}) SELECT set_code FROM applied')
+    else:
+        statement = text(f'''
+            WITH applied AS ({update}),
+            recorded AS (
+                INSERT INTO import_deltas (import_id, card_id, quantity_regular, quantity_foil)
+                SELECT :import_id, id, regular, foil FROM applied
+                ON CONFLICT (import_id, card_id) DO UPDATE
+                SET quantity_regular = import_deltas.quantity_regular + excluded.quantity_regular,
+                    quantity_foil = import_deltas.quantity_foil + excluded.quantity_foil
+            )
+            SELECT set_code FROM applied
+        ''').bindparams(import_id=import_id)
+    updated = db.session.execute(statement).fetchall()
+    set_codes = sorted({set_code for (set_code,) in updated if set_code})
+    return len(updated), set_codes, unknown_ids
+
+
+def revert_quantities(inventory: str, import_id: str) -> Tuple[int, List[str]]:
+    """
+    Subtract an import's recorded deltas from the inventory in one UPDATE ... FROM.
+
+    Quantities are floored at zero in case cards were sold or edited since.
+    The caller commits.
+
+    Returns:
+        Tuple[int, List[str]]: The number of cards updated and their set codes.
+    """
+    regular_column, foil_column = quantity_columns(inventory)
+    reverted = db.session.execute(text(f'''
+        UPDATE cards
+        SET {regular_column} = GREATEST(COALESCE(cards.{regular_column}, 0) - d.quantity_regular, 0),
+            {foil_column} = GREATEST(COALESCE(cards.{foil_column}, 0) - d.quantity_foil, 0)
+        FROM import_deltas d
+        WHERE d.import_id = :import_id AND cards.id = d.card_id
+        RETURNING cards.set_code
+    '''), {'import_id': import_id}).fetchall()
+    return len(reverted), sorted({set_code for (set_code,) in reverted if set_code})
+
+
+def import_inventory(df: pd.DataFrame, inventory: str, import_id: Optional[str] = None) -> ImportResult:
+    """
+    Import one chunk of an inventory CSV as a set-based batch.
+
+    Rows are validated and duplicate (Scryfall ID, foil) rows summed in pandas,
+    COPYed into a temp table, and applied with a single UPDATE that increments
+    the quantities atomically. Invalid rows and unknown IDs are skipped and
+    reported; the rest is imported. The caller commits.
+
+    Args:
+        df (pd.DataFrame): A chunk from read_import_chunks.
+        inventory (str): 'collection' or 'kiosk'.
+        import_id (Optional[str]): The ImportRecord to record per-card deltas against.
+
+    Returns:
+        ImportResult: Row and card counts, touched set codes and the per-row error report.
+    """
+    rows, errors = validate_rows(df)
+    updated_cards, set_codes, unknown_ids = 0, [], []
+    if not rows.empty:
+        copy_into_temp_table(aggregate_rows(rows))
+        updated_cards, set_codes, unknown_ids = apply_quantities(inventory, import_id)
+
+    if unknown_ids:
+        unknown = rows['id'].isin(unknown_ids)
+        errors += row_errors(df, unknown.reindex(df.index, fill_value=False), 'Card not found in the database.')
+        rows = rows[~unknown]
+    errors.sort(key=lambda error: error['row'])
+    return ImportResult(len(df), len(rows), updated_cards, set_codes, errors)
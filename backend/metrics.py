@@ -0,0 +1,217 @@
+from typing import Any, Dict, List, Optional
+from flask import current_app, request
+from redis.exceptions import RedisError
+from time import time, sleep
+from collections import defaultdict
+import os
+import threading
+import orjson
+import logging
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = 'cache:metrics:'
+ROUTES_KEY = f'{METRICS_PREFIX}routes'
+SLOW_REQUESTS_KEY = f'{METRICS_PREFIX}slow'
+
+# Upper bounds (in milliseconds) of the fixed latency histogram buckets
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+OUTCOMES = ('local_hit', 'hit', 'not_modified', 'stale', 'miss', 'bypass', 'error')
+HIT_OUTCOMES = ('local_hit', 'hit', 'not_modified', 'stale')
+
+
+def latency_bucket(elapsed_ms: float) -> str:
+    """Name the histogram bucket a latency falls into."""
+    for bound in LATENCY_BUCKETS_MS:
+        if elapsed_ms <= bound:
+            return f'le_{bound}'
+    return 'le_inf'
+
+
+class MetricsBuffer:
+    """
+    Per-process accumulator for request metrics.
+
+    Requests only add to in-memory counters under a lock; a daemon thread
+    flushes them to Redis in one pipeline every `flush_interval` seconds, so
+    recording a request (a local cache hit in particular) never touches the
+    network. The thread starts lazily, in whichever process records first, so
+    it survives pre-fork servers.
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.slow_requests: List[bytes] = []
+        self.flusher_pid: Optional[int] = None
+
+    def add(self, endpoint: str, fields: Dict[str, int], slow_request: Optional[bytes], slow_window: int) -> None:
+        with self.lock:
+            counters = self.counters[endpoint]
+            for field, amount in fields.items():
+                counters[field] += amount
+            if slow_request is not None:
+                self.slow_requests.append(slow_request)
+                del self.slow_requests[:-slow_window]
+
+    def drain(self):
+        with self.lock:
+            counters, slow_requests = self.counters, self.slow_requests
+            self.counters = defaultdict(lambda: defaultdict(int))
+            self.slow_requests = []
+        return counters, slow_requests
+
+    def flush(self, redis_client, slow_window: int) -> None:
+        """Write the buffered metrics to Redis; on failure they are dropped, not retried."""
+        counters, slow_requests = self.drain()
+        if not counters and not slow_requests:
+            return
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            if counters:
+                pipe.sadd(ROUTES_KEY, *counters)
+            for endpoint, fields in counters.items():
+                for field, amount in fields.items():
+                    pipe.hincrby(f'{METRICS_PREFIX}{endpoint}', field, amount)
+            if slow_requests:
+                pipe.lpush(SLOW_REQUESTS_KEY, *slow_requests)
+                pipe.ltrim(SLOW_REQUESTS_KEY, 0, slow_window - 1)
+            pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to flush cache metrics for {len(counters)} routes: {str(e)}")
+
+    def ensure_flusher(self, app) -> None:
+        """Start this process's flusher thread if it is not running yet."""
+        pid = os.getpid()
+        if self.flusher_pid == pid:
+            return
+        with self.lock:
+            if self.flusher_pid == pid:
+                return
+            self.flusher_pid = pid
+        thread = threading.Thread(target=self.run_flusher, args=(app,), daemon=True, name='metrics-flusher')
+        thread.start()
+
+    def run_flusher(self, app) -> None:
+        while True:
+            sleep(self.flush_interval)
+            try:
+                with app.app_context():
+                    self.flush(app.redis_client, app.config['CACHE_SLOW_REQUEST_WINDOW'])
+            except Exception as e:
+                logger.exception(f"Cache metrics flusher error: {str(e)}")
+
+
+def flush_metrics() -> None:
+    """Flush this process's buffered metrics now, e.g. before reading them back."""
+    current_app.metrics_buffer.flush(current_app.redis_client, current_app.config['CACHE_SLOW_REQUEST_WINDOW'])
+
+
+def record_request(endpoint: str, outcome: str, elapsed: float, payload_bytes: int) -> None:
+    """
+    Record the outcome, latency and payload size of a cached route.
+
+    Only the in-process MetricsBuffer is touched; it is flushed to Redis in the
+    background, so metrics never add a round trip to the response.
+
+    Args:
+        endpoint (str): The Flask endpoint name of the route.
+        outcome (str): One of OUTCOMES.
+        elapsed (float): Request latency in seconds.
+        payload_bytes (int): Size of the response body as sent.
+    """
+    elapsed_ms = elapsed * 1000
+    config = current_app.config
+    slow_request = None
+    if elapsed_ms >= config['CACHE_SLOW_REQUEST_MS']:
+        slow_request = orjson.dumps({
+            'endpoint': endpoint,
+            'path': request.full_path,
+            'outcome': outcome,
+            'elapsed_ms': round(elapsed_ms, 2),
+            'payload_bytes': payload_bytes,
+            'timestamp': time()
+        })
+    buffer = current_app.metrics_buffer
+    buffer.add(endpoint, {
+        outcome: 1,
+        latency_bucket(elapsed_ms): 1,
+        'latency_us_total': int(elapsed * 1_000_000),
+        'bytes_total': payload_bytes,
+    }, slow_request, config['CACHE_SLOW_REQUEST_WINDOW'])
+    buffer.ensure_flusher(current_app._get_current_object())
+
+
+def percentile_from_buckets(counts: Dict[str, int], total: int, quantile: float) -> Optional[float]:
+    """
+    Estimate a latency percentile as the upper bound of the bucket containing it.
+
+    Returns None when nothing was recorded or the percentile falls past the last bucket.
+    """
+    if not total:
+        return None
+    target = quantile * total
+    cumulative = 0
+    for bound in LATENCY_BUCKETS_MS:
+        cumulative += counts.get(f'le_{bound}', 0)
+        if cumulative >= target:
+            return float(bound)
+    return None
+
+
+def summarize_route(raw: Dict[bytes, bytes]) -> Dict[str, Any]:
+    counts = {key.decode(): int(value) for key, value in raw.items()}
+    calls = sum(counts.get(outcome, 0) for outcome in OUTCOMES)
+    hits = sum(counts.get(outcome, 0) for outcome in HIT_OUTCOMES)
+    return {
+        'calls': calls,
+        **{outcome: counts.get(outcome, 0) for outcome in OUTCOMES},
+        'hit_rate': round(hits / calls * 100, 2) if calls else 0,
+        'avg_ms': round(counts.get('latency_us_total', 0) / calls / 1000, 2) if calls else 0,
+        'p50_ms': percentile_from_buckets(counts, calls, 0.50),
+        'p95_ms': percentile_from_buckets(counts, calls, 0.95),
+        'p99_ms': percentile_from_buckets(counts, calls, 0.99),
+        'avg_payload_bytes': round(counts.get('bytes_total', 0) / calls) if calls else 0,
+    }
+
+
+def collect_metrics() -> Dict[str, Any]:
+    """
+    Summarize the recorded metrics for every cached route.
+
+    Returns:
+        Dict[str, Any]: Overall totals, per-route hit rates, latency percentiles
+        and payload sizes, and the window of recent slow requests.
+    """
+    flush_metrics()
+    redis_client = current_app.redis_client
+    endpoints: List[str] = sorted(endpoint.decode() for endpoint in redis_client.smembers(ROUTES_KEY))
+
+    pipe = redis_client.pipeline(transaction=False)
+    for endpoint in endpoints:
+        pipe.hgetall(f'{METRICS_PREFIX}{endpoint}')
+    pipe.lrange(SLOW_REQUESTS_KEY, 0, -1)
+    *route_hashes, slow_requests = pipe.execute()
+
+    routes = {endpoint: summarize_route(raw) for endpoint, raw in zip(endpoints, route_hashes)}
+    total_calls = sum(route['calls'] for route in routes.values())
+    hits = sum(route[outcome] for route in routes.values() for outcome in HIT_OUTCOMES)
+    misses = sum(route['miss'] for route in routes.values())
+
+    return {
+        'total_calls': total_calls,
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': f"{(hits / total_calls * 100) if total_calls else 0:.2f}%",
+        'routes': routes,
+        'slow_requests': [orjson.loads(item) for item in slow_requests]
+    }
+
+
+def reset_metrics() -> None:
+    """Drop every recorded metric."""
+    current_app.metrics_buffer.drain()
+    redis_client = current_app.redis_client
+    endpoints = redis_client.smembers(ROUTES_KEY)
+    redis_client.delete(ROUTES_KEY, SLOW_REQUESTS_KEY, *(f'{METRICS_PREFIX}{e.decode()}' for e in endpoints))
@@ -0,0 +1,33 @@
+"""Add generated, weighted card search vector
+
+Revision ID: a7c3e91f4b2d
+Revises: b3f9a7c9e7d0
+Create Date: 2026-10-18 09:12:40.118263
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e91f4b2d'
+down_revision = 'b3f9a7c9e7d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Postgres keeps the generated column in sync with name, type_line and oracle_text
+    op.execute("""
+        ALTER TABLE cards ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english'::regconfig, coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('english'::regconfig, coalesce(type_line, '')), 'B') ||
+            setweight(to_tsvector('english'::regconfig, coalesce(oracle_text, '')), 'C')
+        ) STORED
+    """)
+    op.create_index('idx_cards_search_vector', 'cards', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('idx_cards_search_vector', table_name='cards', postgresql_using='gin')
+    op.drop_column('cards', 'search_vector')
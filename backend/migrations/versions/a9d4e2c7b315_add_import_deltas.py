@@ -0,0 +1,38 @@
+"""Add import content hashes and per-card import deltas
+
+Revision ID: a9d4e2c7b315
+Revises: f3a9c2d71e58
+Create Date: 2026-10-18 15:37:52.114806
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d4e2c7b315'
+down_revision = 'f3a9c2d71e58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('import_records', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.add_column('import_records', sa.Column('undone_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_import_records_content_hash', 'import_records', ['content_hash'], unique=False)
+    op.create_table(
+        'import_deltas',
+        sa.Column('import_id', sa.String(), nullable=False),
+        sa.Column('card_id', sa.String(), nullable=False),
+        sa.Column('quantity_regular', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('quantity_foil', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['import_id'], ['import_records.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('import_id', 'card_id')
+    )
+
+
+def downgrade():
+    op.drop_table('import_deltas')
+    op.drop_index('ix_import_records_content_hash', table_name='import_records')
+    op.drop_column('import_records', 'undone_at')
+    op.drop_column('import_records', 'content_hash')
@@ -0,0 +1,27 @@
+"""Add card content and price fingerprints for incremental catalog refreshes
+
+Revision ID: b6e1f08d4a27
+Revises: a9d4e2c7b315
+Create Date: 2026-10-18 17:12:03.527941
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e1f08d4a27'
+down_revision = 'a9d4e2c7b315'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows start without fingerprints and are rewritten once by the next refresh
+    op.add_column('cards', sa.Column('content_hash', sa.Text(), nullable=True))
+    op.add_column('cards', sa.Column('price_hash', sa.Text(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('cards', 'price_hash')
+    op.drop_column('cards', 'content_hash')
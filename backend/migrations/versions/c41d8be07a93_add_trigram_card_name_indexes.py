@@ -0,0 +1,41 @@
+"""Add trigram card name indexes and card_names typeahead view
+
+Revision ID: c41d8be07a93
+Revises: a7c3e91f4b2d
+Create Date: 2026-10-18 10:03:17.552908
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d8be07a93'
+down_revision = 'a7c3e91f4b2d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # Serves the ILIKE '%name%' filters on the card listings
+    op.execute('CREATE INDEX idx_cards_name_trgm ON cards USING gin (name gin_trgm_ops)')
+
+    # One row per distinct card (oracle_id) for typeahead
+    op.execute('''
+        CREATE MATERIALIZED VIEW card_names AS
+        SELECT COALESCE(oracle_id, id) AS oracle_id,
+               MIN(name) AS name,
+               COUNT(*) AS printings
+        FROM cards
+        GROUP BY COALESCE(oracle_id, id)
+    ''')
+    op.execute('CREATE UNIQUE INDEX idx_card_names_oracle_id ON card_names (oracle_id)')
+    op.execute('CREATE INDEX idx_card_names_name_trgm ON card_names USING gin (name gin_trgm_ops)')
+    op.execute('CREATE INDEX idx_card_names_lower_name ON card_names (lower(name) text_pattern_ops)')
+
+
+def downgrade():
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS card_names')
+    op.execute('DROP INDEX IF EXISTS idx_cards_name_trgm')
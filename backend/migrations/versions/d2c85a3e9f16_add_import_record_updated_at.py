@@ -0,0 +1,24 @@
+"""Add updated_at to import_records for detecting orphaned imports
+
+Revision ID: d2c85a3e9f16
+Revises: b6e1f08d4a27
+Create Date: 2026-10-18 19:08:41.276534
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2c85a3e9f16'
+down_revision = 'b6e1f08d4a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('import_records', sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('import_records', 'updated_at')
@@ -0,0 +1,36 @@
+"""Add collector sort key and keyset pagination indexes
+
+Revision ID: e5b20f6d8c14
+Revises: c41d8be07a93
+Create Date: 2026-10-18 11:21:45.309127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b20f6d8c14'
+down_revision = 'c41d8be07a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        ALTER TABLE cards ADD COLUMN collector_sort_key text GENERATED ALWAYS AS (
+            lpad(coalesce(substring(collector_number from '[0-9]+'), ''), 8, '0') || collector_number
+        ) STORED
+    """)
+    op.create_index('idx_cards_keyset', 'cards', ['set_code', 'collector_sort_key', 'id'], unique=False)
+    op.create_index('idx_cards_keyset_collection', 'cards', ['set_code', 'collector_sort_key', 'id'], unique=False,
+                    postgresql_where=sa.text('quantity_regular > 0 OR quantity_foil > 0'))
+    op.create_index('idx_cards_keyset_kiosk', 'cards', ['set_code', 'collector_sort_key', 'id'], unique=False,
+                    postgresql_where=sa.text('quantity_kiosk_regular > 0 OR quantity_kiosk_foil > 0'))
+
+
+def downgrade():
+    op.drop_index('idx_cards_keyset_kiosk', table_name='cards')
+    op.drop_index('idx_cards_keyset_collection', table_name='cards')
+    op.drop_index('idx_cards_keyset', table_name='cards')
+    op.drop_column('cards', 'collector_sort_key')
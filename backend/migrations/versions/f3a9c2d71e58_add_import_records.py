@@ -0,0 +1,43 @@
+"""Add import_records for background CSV imports
+
+Revision ID: f3a9c2d71e58
+Revises: e5b20f6d8c14
+Create Date: 2026-10-18 14:02:17.845310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c2d71e58'
+down_revision = 'e5b20f6d8c14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'import_records',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.Column('inventory', sa.String(length=16), nullable=False),
+        sa.Column('filename', sa.String(), nullable=True),
+        sa.Column('upload_path', sa.String(), nullable=True),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('rows_total', sa.Integer(), nullable=True),
+        sa.Column('rows_processed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('rows_failed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('summary', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_import_records_status', 'import_records', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_import_records_status', table_name='import_records')
+    op.drop_table('import_records')
@@ -1,5 +1,8 @@
 from .card import Card
 from .set import Set
 from .set_collection_count import SetCollectionCount
+from .card_name import CardName
+from .import_record import ImportRecord
+from .import_delta import ImportDelta
 
 # This file ensures that all models are imported when the models package is imported
@@ -1,7 +1,7 @@
 from database import db
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy import event, Index, func
-from sqlalchemy.orm import relationship, Session
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy import event, Index, func, Computed
+from sqlalchemy.orm import relationship, Session, deferred, column_property
 from sqlalchemy import text
 
 class Card(db.Model):
@@ -22,6 +22,8 @@ class Card(db.Model):
     highres_image = db.Column(db.Boolean)
     image_status = db.Column(db.Text)
     image_uris = db.Column(JSONB)
+    # Just the small image URL, for grids that don't need the whole image_uris document
+    image_uri_small = column_property(image_uris['small'].astext, deferred=True)
     mana_cost = db.Column(db.Text)
     cmc = db.Column(db.Float, index=True)
     type_line = db.Column(db.Text, index=True)
@@ -62,11 +64,28 @@ class Card(db.Model):
     promo_types = db.Column(JSONB)
     usd_price = db.Column(db.Numeric)
     usd_foil_price = db.Column(db.Numeric)
+    # Fingerprints of the Scryfall data (prices, and everything else) so catalog refreshes skip unchanged cards
+    content_hash = deferred(db.Column(db.Text))
+    price_hash = deferred(db.Column(db.Text))
     quantity_regular = db.Column(db.BigInteger, default=0)
     quantity_foil = db.Column(db.BigInteger, default=0)
     quantity_kiosk_regular = db.Column(db.BigInteger, default=0)
     quantity_kiosk_foil = db.Column(db.BigInteger, default=0)
 
+    # Weighted full-text document maintained by Postgres (name > type_line > oracle_text)
+    search_vector = deferred(db.Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('english'::regconfig, coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english'::regconfig, coalesce(type_line, '')), 'B') || "
+        "setweight(to_tsvector('english'::regconfig, coalesce(oracle_text, '')), 'C')",
+        persisted=True
+    )))
+
+    # Zero-padded leading number then the raw collector number, so '9' < '10' < '10a'
+    collector_sort_key = db.Column(db.Text, Computed(
+        "lpad(coalesce(substring(collector_number from '[0-9]+'), ''), 8, '0') || collector_number",
+        persisted=True
+    ))
+
     # Relationships
     set = db.relationship('Set', back_populates='cards')
 
@@ -74,45 +93,111 @@ class Card(db.Model):
     __table_args__ = (
         Index('idx_card_collection_quantities', 'quantity_regular', 'quantity_foil'),
         Index('idx_card_kiosk_quantities', 'quantity_kiosk_regular', 'quantity_kiosk_foil'),
+        Index('idx_cards_search_vector', 'search_vector', postgresql_using='gin'),
+        # Trigram matching for fuzzy name search (see migration c41d8be07a93)
+        Index('idx_cards_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        # Keyset pagination order (see pagination.KEYSET_COLUMNS)
+        Index('idx_cards_keyset', 'set_code', 'collector_sort_key', 'id'),
+        Index('idx_cards_keyset_collection', 'set_code', 'collector_sort_key', 'id',
+              postgresql_where=text('quantity_regular > 0 OR quantity_foil > 0')),
+        Index('idx_cards_keyset_kiosk', 'set_code', 'collector_sort_key', 'id',
+              postgresql_where=text('quantity_kiosk_regular > 0 OR quantity_kiosk_foil > 0')),
+    )
+
+    # Keys emitted by to_dict by default, in order; the quantity keys resolve per quantity_type
+    FIELDS = (
+        'id', 'name', 'set_name', 'set_code', 'collector_number', 'type_line', 'rarity',
+        'mana_cost', 'cmc', 'oracle_text', 'colors', 'image_uris', 'prices', 'frame_effects',
+        'promo_types', 'promo', 'reprint', 'variation', 'oversized', 'keywords', 'full_art',
+        'textless', 'booster', 'story_spotlight', 'quantity_regular', 'quantity_foil',
     )
+    # Only emitted when asked for with fields=
+    EXTRA_FIELDS = ('image_uri_small', 'released_at', 'usd_price', 'usd_foil_price')
+
+    # Named fields= presets
+    FIELD_PRESETS = {
+        'grid': ('id', 'name', 'set_code', 'collector_number', 'rarity', 'image_uri_small',
+                 'quantity_regular', 'quantity_foil'),
+        'inventory': ('id', 'name', 'set_code', 'set_name', 'collector_number', 'rarity',
+                      'usd_price', 'usd_foil_price', 'quantity_regular', 'quantity_foil'),
+        'detail': FIELDS,
+    }
+
+    # Columns behind the quantity keys for each quantity_type; other types report 0
+    QUANTITY_COLUMNS = {
+        'collection': {'quantity_regular': 'quantity_regular', 'quantity_foil': 'quantity_foil'},
+        'kiosk': {'quantity_regular': 'quantity_kiosk_regular', 'quantity_foil': 'quantity_kiosk_foil'},
+    }
+
+    @classmethod
+    def dict_columns(cls):
+        """Columns read by to_dict, for use with load_only."""
+        return (
+            cls.id, cls.name, cls.set_name, cls.set_code, cls.collector_number,
+            cls.type_line, cls.rarity, cls.mana_cost, cls.cmc, cls.oracle_text,
+            cls.colors, cls.image_uris, cls.prices, cls.frame_effects, cls.promo_types,
+            cls.promo, cls.reprint, cls.variation, cls.oversized, cls.keywords,
+            cls.full_art, cls.textless, cls.booster, cls.story_spotlight,
+            cls.quantity_regular, cls.quantity_foil, cls.quantity_kiosk_regular, cls.quantity_kiosk_foil,
+        )
+
+    @classmethod
+    def parse_fields(cls, spec):
+        """
+        Resolve a fields= value into the keys to serialize.
+
+        Args:
+            spec (Optional[str]): Comma-separated presets and/or field names.
+
+        Returns:
+            Optional[Tuple[str, ...]]: The fields in order, always including id,
+            or None when no selection was made.
+
+        Raises:
+            ValueError: If a name is neither a preset nor a field.
+        """
+        if not spec or not spec.strip():
+            return None
+        fields = ['id']
+        for name in (part.strip() for part in spec.split(',')):
+            if name in cls.FIELD_PRESETS:
+                fields.extend(cls.FIELD_PRESETS[name])
+            elif name in cls.FIELDS or name in cls.EXTRA_FIELDS:
+                fields.append(name)
+            elif name:
+                raise ValueError(f"Unknown field: {name}")
+        return tuple(dict.fromkeys(fields))
+
+    @classmethod
+    def field_columns(cls, fields=None, quantity_type='collection'):
+        """Columns to load_only for serializing `fields` (all of to_dict when None)."""
+        if fields is None:
+            return cls.dict_columns()
+        quantity_columns = cls.QUANTITY_COLUMNS.get(quantity_type, {})
+        columns = []
+        for field in fields:
+            if field in ('quantity_regular', 'quantity_foil'):
+                if field in quantity_columns:
+                    columns.append(getattr(cls, quantity_columns[field]))
+            else:
+                columns.append(getattr(cls, field))
+        return tuple(columns)
+
+    def to_dict(self, quantity_type='collection', fields=None):
+        """
+        Serialize the card object to a dictionary.
 
-    def to_dict(self, quantity_type='collection'):
-        """Serialize the card object to a dictionary."""
-        data = {
-            'id': self.id,
-            'name': self.name,
-            'set_name': self.set_name,
-            'set_code': self.set_code,
-            'collector_number': self.collector_number,
-            'type_line': self.type_line,
-            'rarity': self.rarity,
-            'mana_cost': self.mana_cost,
-            'cmc': self.cmc,
-            'oracle_text': self.oracle_text,
-            'colors': self.colors,
-            'image_uris': self.image_uris,
-            'prices': self.prices,
-            'frame_effects': self.frame_effects,
-            'promo_types': self.promo_types,
-            'promo': self.promo,
-            'reprint': self.reprint,
-            'variation': self.variation,
-            'oversized': self.oversized,
-            'keywords': self.keywords,
-            'full_art': self.full_art,
-            'textless': self.textless,
-            'booster': self.booster,
-            'story_spotlight': self.story_spotlight,
-        }
-        if quantity_type == 'collection':
-            data['quantity_regular'] = self.quantity_regular
-            data['quantity_foil'] = self.quantity_foil
-        elif quantity_type == 'kiosk':
-            data['quantity_regular'] = self.quantity_kiosk_regular
-            data['quantity_foil'] = self.quantity_kiosk_foil
-        else:
-            data['quantity_regular'] = 0
-            data['quantity_foil'] = 0
+        Args:
+            quantity_type (str): Which inventory the quantity keys report ('collection' or 'kiosk').
+            fields (Optional[Tuple[str, ...]]): Keys to emit, from parse_fields. Defaults to FIELDS.
+        """
+        fields = fields or self.FIELDS
+        data = {field: getattr(self, field) for field in fields
+                if field not in ('quantity_regular', 'quantity_foil')}
+        quantity_columns = self.QUANTITY_COLUMNS.get(quantity_type, {})
+        for field in ('quantity_regular', 'quantity_foil'):
+            if field in fields:
+                data[field] = getattr(self, quantity_columns[field]) if field in quantity_columns else 0
         return data
 
 # Remove the event listener
@@ -0,0 +1,26 @@
+from database import db
+from sqlalchemy.sql import text
+
+
+class CardName(db.Model):
+    __tablename__ = 'card_names'
+    __table_args__ = {'info': dict(is_view=True)}
+
+    oracle_id = db.Column(db.Text, primary_key=True)
+    name = db.Column(db.Text, nullable=False)
+    printings = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<CardName {self.oracle_id}: {self.name}>'
+
+    def to_dict(self):
+        return {
+            'oracle_id': self.oracle_id,
+            'name': self.name,
+            'printings': self.printings
+        }
+
+    @classmethod
+    def refresh(cls):
+        db.session.execute(text('REFRESH MATERIALIZED VIEW CONCURRENTLY card_names'))
+        db.session.commit()
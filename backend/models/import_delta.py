@@ -0,0 +1,14 @@
+from database import db
+
+
+class ImportDelta(db.Model):
+    """The quantities one import added to one card, kept so the import can be undone."""
+    __tablename__ = 'import_deltas'
+
+    import_id = db.Column(db.String, db.ForeignKey('import_records.id', ondelete='CASCADE'), primary_key=True)
+    card_id = db.Column(db.String, primary_key=True)
+    quantity_regular = db.Column(db.Integer, nullable=False, default=0)
+    quantity_foil = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ImportDelta {self.import_id}/{self.card_id}: +{self.quantity_regular}/+{self.quantity_foil}>'
@@ -1,16 +1,101 @@
- from database import db
- from sqlalchemy.dialects.postgresql import JSONB
- from datetime import datetime
+from database import db
+from sqlalchemy.dialects.postgresql import JSONB
+from datetime import datetime, timedelta
 
- class ImportRecord(db.Model):
-     __tablename__ = 'import_records'
+class ImportRecord(db.Model):
+    __tablename__ = 'import_records'
 
-     id = db.Column(db.String, primary_key=True)
-     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-     summary = db.Column(JSONB)
+    # Job states, in order
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    UNDONE = 'undone'
+    FINISHED_STATUSES = (COMPLETED, FAILED)
 
-     # Relationship
-     cards = db.relationship('Card', back_populates='import_record')
+    id = db.Column(db.String, primary_key=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    inventory = db.Column(db.String(16), nullable=False)
+    filename = db.Column(db.String)
+    # SHA-256 of the uploaded bytes, to catch the same file being imported twice
+    content_hash = db.Column(db.String(64), index=True)
+    upload_path = db.Column(db.String)
+    status = db.Column(db.String(16), nullable=False, default=QUEUED, index=True)
+    rows_total = db.Column(db.Integer)
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    rows_failed = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    undone_at = db.Column(db.DateTime)
+    # Bumped by every progress commit, so a job whose worker died can be told apart from a slow one
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    error = db.Column(db.Text)
+    summary = db.Column(JSONB)
 
-     def __repr__(self):
-         return f'<ImportRecord {self.id}: {self.timestamp}>'
\ No newline at end of file
+    deltas = db.relationship('ImportDelta', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
+
+    @property
+    def elapsed_seconds(self):
+        if not self.started_at:
+            return None
+        return round(((self.finished_at or datetime.utcnow()) - self.started_at).total_seconds(), 2)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'inventory': self.inventory,
+            'filename': self.filename,
+            'content_hash': self.content_hash,
+            'status': self.status,
+            'rows_total': self.rows_total,
+            'rows_processed': self.rows_processed,
+            'rows_failed': self.rows_failed,
+            'elapsed_seconds': self.elapsed_seconds,
+            'created_at': self.timestamp.isoformat() if self.timestamp else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'undone_at': self.undone_at.isoformat() if self.undone_at else None,
+            'error': self.error,
+            'summary': self.summary,
+        }
+
+    @classmethod
+    def fail_stale(cls, stale_after):
+        """
+        Mark running imports with no progress for `stale_after` seconds as failed.
+
+        Their worker process died (or was restarted) mid-job, so nothing will
+        ever finish them. Queued imports are left alone: they make no progress
+        while they wait for a free worker, however healthy. The caller commits.
+
+        Returns:
+            int: The number of imports marked failed.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+        return cls.query.filter(
+            cls.status == cls.RUNNING,
+            db.func.coalesce(cls.updated_at, cls.started_at, cls.timestamp) < cutoff
+        ).update({
+            cls.status: cls.FAILED,
+            cls.error: f'Import made no progress for {stale_after} seconds; its worker probably stopped',
+            cls.finished_at: datetime.utcnow(),
+        }, synchronize_session='fetch')
+
+    @classmethod
+    def find_duplicate(cls, content_hash, inventory):
+        """
+        An earlier import of the same file into the same inventory whose quantities
+        are (or are about to be) applied: one that is pending, completed, or failed
+        after committing some rows. Undone imports do not count.
+        """
+        return cls.query.filter(
+            cls.content_hash == content_hash,
+            cls.inventory == inventory,
+            db.or_(
+                cls.status.in_((cls.QUEUED, cls.RUNNING, cls.COMPLETED)),
+                db.and_(cls.status == cls.FAILED, cls.rows_processed > 0)
+            )
+        ).order_by(cls.timestamp.desc()).first()
+
+    def __repr__(self):
+        return f'<ImportRecord {self.id}: {self.status} at {self.timestamp}>'
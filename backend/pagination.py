@@ -0,0 +1,107 @@
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import tuple_
+from sqlalchemy.orm import undefer
+from models.card import Card
+import base64
+import binascii
+import orjson
+
+# Stable, unique sort order for keyset pages, backed by the idx_cards_keyset* indexes
+KEYSET_COLUMNS = (Card.set_code, Card.collector_sort_key, Card.id)
+
+NEXT = 'next'
+PREV = 'prev'
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+class KeysetPage(NamedTuple):
+    items: List[Any]
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+    per_page: int
+    total: Optional[int] = None
+
+    def meta(self) -> Dict[str, Any]:
+        """Pagination fields for the response body; total only when it was counted."""
+        meta = {
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+            'per_page': self.per_page,
+        }
+        if self.total is not None:
+            meta['total'] = self.total
+        return meta
+
+
+def encode_cursor(card: Card, direction: str) -> str:
+    key = [getattr(card, column.key) for column in KEYSET_COLUMNS]
+    return base64.urlsafe_b64encode(orjson.dumps([direction, key])).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, List[str]]:
+    try:
+        direction, key = orjson.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError):
+        raise InvalidCursorError('Invalid pagination cursor.')
+    if direction not in (NEXT, PREV) or not isinstance(key, list) or len(key) != len(KEYSET_COLUMNS):
+        raise InvalidCursorError('Invalid pagination cursor.')
+    return direction, key
+
+
+def keyset_paginate(query, cursor: Optional[str], per_page: int, include_total: bool = False) -> KeysetPage:
+    """
+    Fetch one page of cards by seeking past a cursor instead of using OFFSET.
+
+    Rows are ordered by KEYSET_COLUMNS and the cursor holds the sort key of the
+    first or last row of the previous page, so every page is a single index
+    range scan of `per_page + 1` rows no matter how deep it is. The extra row
+    tells whether another page exists.
+
+    Cards with a NULL set_code or collector_sort_key are left out of every page
+    (and the total): a row comparison against NULL is never true, so no cursor
+    could reach them. Page/offset listings still include them.
+
+    Args:
+        query: A Card query with the listing's filters applied.
+        cursor (Optional[str]): A next_cursor or prev_cursor from an earlier page;
+            empty for the first page.
+        per_page (int): Page size.
+        include_total (bool): Also run the COUNT(*) for the total.
+
+    Returns:
+        KeysetPage: The cards on the page and the cursors around it.
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed.
+    """
+    direction, key = decode_cursor(cursor) if cursor else (NEXT, None)
+    sort_key = tuple_(*KEYSET_COLUMNS)
+    query = query.filter(*(column.isnot(None) for column in KEYSET_COLUMNS[:-1]))
+
+    # The cursor is built from the sort key columns, so load them even under load_only
+    page_query = query.order_by(None).options(*(undefer(column) for column in KEYSET_COLUMNS))
+    if direction == NEXT:
+        if key is not None:
+            page_query = page_query.filter(sort_key > tuple_(*key))
+        page_query = page_query.order_by(*(column.asc() for column in KEYSET_COLUMNS))
+    else:
+        page_query = page_query.filter(sort_key < tuple_(*key))
+        page_query = page_query.order_by(*(column.desc() for column in KEYSET_COLUMNS))
+
+    rows = page_query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+
+    if direction == NEXT:
+        next_cursor = encode_cursor(items[-1], NEXT) if has_more else None
+        prev_cursor = encode_cursor(items[0], PREV) if key is not None and items else None
+    else:
+        items.reverse()
+        next_cursor = encode_cursor(items[-1], NEXT) if items else None
+        prev_cursor = encode_cursor(items[0], PREV) if has_more else None
+
+    total = query.order_by(None).count() if include_total else None
+    return KeysetPage(items, next_cursor, prev_cursor, per_page, total)
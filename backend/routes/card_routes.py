@@ -1,23 +1,43 @@
 from flask import Blueprint, jsonify, request, current_app
 from models.card import Card
-from sqlalchemy import or_
-from sqlalchemy.orm import load_only, joinedload
+from models.card_name import CardName
+from database import db
+from sqlalchemy import or_, func, literal, null
+from sqlalchemy.orm import load_only
 import orjson
 import logging
-from utils import cache_response
+from utils import cache_response, orjson_default, escape_like
+from cache import versioned_key
+from redis.exceptions import RedisError
+from metrics import collect_metrics, reset_metrics
 from errors import handle_error, APIError
 from schemas import CardSearchSchema
+from card_query import compile_query, QuerySyntaxError, QUERY_DOMAINS
+from pagination import keyset_paginate, InvalidCursorError
+from counts import paginate_counted, COUNT_MODES
+from card_serialization import select_cards_json, json_object
+from formats import MSGPACK_MIMETYPE, ARROW_MIMETYPE
 
 logger = logging.getLogger(__name__)
 
 card_routes = Blueprint('card_routes', __name__)
 
+# Per-card entries are versioned by the collection generation, so they can live long
+BULK_CARD_CACHE_TIMEOUT = 3600
+
+# ts_headline options for search snippets; matches are wrapped in <mark>
+SEARCH_HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=25, MinWords=8'
+
+# Shorter typeahead input has too few trigrams to match on, so it only prefix-matches
+AUTOCOMPLETE_MIN_FUZZY_LENGTH = 3
+AUTOCOMPLETE_MAX_LIMIT = 25
+
 @card_routes.errorhandler(APIError)
 def handle_api_error(error):
     return handle_error(error.status_code, error.message, error.error_type)
 
 @card_routes.route('/cards', methods=['GET'])
-@cache_response()
+@cache_response(domains=('collection',))
 def get_cards():
     schema = CardSearchSchema()
     errors = schema.validate(request.args)
@@ -30,8 +50,12 @@ def get_cards():
     set_code = request.args.get('set_code', '')
     rarity = request.args.get('rarity', '')
     colors = request.args.get('colors', '').split(',') if request.args.get('colors') else []
+    try:
+        fields = Card.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
 
-    query = Card.query
+    query = Card.query.options(load_only(*Card.field_columns(fields)))
 
     if name:
         query = query.filter(Card.name.ilike(f'%{name}%'))
@@ -42,184 +66,264 @@ def get_cards():
     if colors:
         query = query.filter(Card.colors.contains(colors))
 
-    cards = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Cursor mode: ?cursor= for the first page, then the returned next/prev cursors
+    if 'cursor' in request.args:
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        try:
+            keyset_page = keyset_paginate(query, request.args.get('cursor'), per_page, include_total)
+        except InvalidCursorError as e:
+            return {"error": str(e)}, 400
+        return {'cards': [card.to_dict(fields=fields) for card in keyset_page.items], **keyset_page.meta()}, 200
+
+    count_mode = request.args.get('count', 'exact')
+    if count_mode not in COUNT_MODES:
+        return {"error": f"Invalid count mode: {count_mode}. Use one of {', '.join(COUNT_MODES)}."}, 400
+    cards = paginate_counted(query, page, per_page, count_mode, ['collection'])
 
     response = {
-        'cards': [card.to_dict() for card in cards.items],
-        'total': cards.total,
-        'pages': cards.pages,
-        'current_page': page
+        'cards': [card.to_dict(fields=fields) for card in cards.items],
+        **cards.meta()
     }
 
     return response, 200  # Let the decorator handle serialization and caching
 
 @card_routes.route('/cards/<string:card_id>', methods=['GET'])
-@cache_response()
+@cache_response(domains=('collection',))
 def get_card(card_id):
+    try:
+        fields = Card.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
     # Fetch card from database, with optimization to load only the required fields
-    card = Card.query.options(
-        load_only(
-            Card.id,
-            Card.name,
-            Card.image_uris,
-            Card.collector_number,
-            Card.prices,
-            Card.rarity,
-            Card.set_name,
-            Card.set_code,
-            Card.type_line,
-            Card.mana_cost,
-            Card.cmc,
-            Card.oracle_text,
-            Card.colors,
-            Card.quantity_regular,
-            Card.quantity_foil,
-            Card.quantity_kiosk_regular,
-            Card.quantity_kiosk_foil,
-            Card.frame_effects,
-            Card.promo_types,
-            Card.promo,
-            Card.reprint,
-            Card.variation,
-            Card.oversized,
-            Card.keywords
-        )
-    ).filter_by(id=card_id).first()
+    card = Card.query.options(load_only(*Card.field_columns(fields))).filter_by(id=card_id).first()
 
     if not card:
         return {"error": "Card not found."}, 404
 
     # Serialize card data
-    card_data = card.to_dict()
+    card_data = card.to_dict(fields=fields)
 
     return card_data, 200  # Let the decorator handle serialization and caching
 
 @card_routes.route('/cards/bulk', methods=['POST'])
 def get_bulk_cards():
-    data = request.json
+    """
+    Look up many cards by Scryfall ID, preserving the request order.
+
+    Cached cards are fetched with a single MGET, misses are loaded from the
+    database in chunks, and the freshly serialized cards are written back in
+    one pipeline. Cached JSON is spliced into the response without decoding.
+    """
+    data = request.get_json(silent=True) or {}
     card_ids = data.get('card_ids', [])
     if not card_ids:
         return jsonify({"error": "No card IDs provided."}), 400
+    if not isinstance(card_ids, list) or not all(isinstance(card_id, str) for card_id in card_ids):
+        return jsonify({"error": "card_ids must be a list of strings."}), 400
+    max_ids = current_app.config['BULK_CARDS_MAX_IDS']
+    if len(card_ids) > max_ids:
+        return jsonify({"error": f"At most {max_ids} card IDs can be requested at once."}), 400
 
-    # Check if cards are already in cache
-    cards_data = []
-    card_ids_to_query = []
-    for card_id in card_ids:
-        cached_card = current_app.redis_client.get(f"card:{card_id}")
-        if cached_card:
-            cards_data.append(orjson.loads(cached_card))
-        else:
-            card_ids_to_query.append(card_id)
-
-    # Fetch cards from database that were not in cache
-    if card_ids_to_query:
-        cards = Card.query.options(
-            load_only(
-                Card.id,
-                Card.name,
-                Card.image_uris,
-                Card.collector_number,
-                Card.prices,
-                Card.rarity,
-                Card.set_name,
-                Card.set_code,
-                Card.type_line,
-                Card.mana_cost,
-                Card.cmc,
-                Card.oracle_text,
-                Card.colors,
-                Card.quantity_collection_regular,
-                Card.quantity_collection_foil,
-                Card.quantity_kiosk_regular,
-                Card.quantity_kiosk_foil,
-                Card.frame_effects,
-                Card.promo_types,
-                Card.promo,
-                Card.reprint,
-                Card.variation,
-                Card.oversized,
-                Card.keywords
-            )
-        ).filter(Card.id.in_(card_ids_to_query)).all()
-
-        for card in cards:
-            serialized_card = orjson.dumps(card.to_dict()).decode()
-            # Cache each card for 5 minutes
-            current_app.redis_client.setex(f"card:{card.id}", 300, serialized_card)
-            cards_data.append(card.to_dict())
-
-    return jsonify({"cards": cards_data}), 200
+    redis_client = current_app.redis_client
+    unique_ids = list(dict.fromkeys(card_ids))
+
+    # One round trip for every cached card; without Redis every card is a miss
+    try:
+        key_prefix = versioned_key('card', ['collection'])
+        cache_keys = [f"{key_prefix}:{card_id}" for card_id in unique_ids]
+        cards_json = {
+            card_id: cached for card_id, cached in zip(unique_ids, redis_client.mget(cache_keys)) if cached
+        }
+    except RedisError as e:
+        logger.warning(f"Bulk card cache unavailable: {str(e)}")
+        key_prefix, cards_json = None, {}
+
+    # Load the misses in chunks and cache them in one pipeline
+    missing_ids = [card_id for card_id in unique_ids if card_id not in cards_json]
+    if missing_ids:
+        # Without Redis the misses are only loaded, not queued for caching
+        pipe = redis_client.pipeline(transaction=False) if key_prefix else None
+        chunk_size = current_app.config['BULK_CARDS_DB_CHUNK_SIZE']
+        for start in range(0, len(missing_ids), chunk_size):
+            chunk = missing_ids[start:start + chunk_size]
+            cards = Card.query.options(load_only(*Card.dict_columns())).filter(Card.id.in_(chunk)).all()
+            for card in cards:
+                serialized_card = orjson.dumps(card.to_dict(), default=orjson_default)
+                cards_json[card.id] = serialized_card
+                if pipe is not None:
+                    pipe.set(f"{key_prefix}:{card.id}", serialized_card, ex=BULK_CARD_CACHE_TIMEOUT)
+        if pipe is not None:
+            try:
+                pipe.execute()
+            except RedisError as e:
+                logger.warning(f"Could not cache bulk cards: {str(e)}")
+
+    found = [cards_json[card_id] for card_id in card_ids if card_id in cards_json]
+    not_found = [card_id for card_id in unique_ids if card_id not in cards_json]
+    body = b'{"cards":[' + b','.join(found) + b'],"not_found":' + orjson.dumps(not_found) + b'}'
+
+    return current_app.response_class(response=body, status=200, mimetype='application/json')
 
 @card_routes.route('/cards/search', methods=['GET'])
+@cache_response(domains=QUERY_DOMAINS)
 def search_cards():
-    query_param = request.args.get('q', '')
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 50, type=int)
-
-    query = Card.query.options(load_only(
-        Card.id, Card.name, Card.set_name, Card.set_code, Card.collector_number,
-        Card.type_line, Card.rarity, Card.mana_cost, Card.cmc, Card.oracle_text,
-        Card.colors, Card.image_uris, Card.prices, Card.quantity_collection_regular,
-        Card.quantity_collection_foil, Card.quantity_kiosk_regular, Card.quantity_kiosk_foil,
-        Card.frame_effects, Card.promo_types, Card.promo, Card.reprint, Card.variation,
-        Card.oversized, Card.keywords
-    )).filter(
-        or_(
-            Card.name.ilike(f'%{query_param}%'),
-            Card.type_line.ilike(f'%{query_param}%'),
-            Card.oracle_text.ilike(f'%{query_param}%')
-        )
+    """
+    Full-text search over name, type line and oracle text, ranked by relevance.
+
+    `q` accepts web-search syntax ("quoted phrases", -exclusions, or). Matches
+    come from the GIN-indexed search_vector; the snippet is only built for the
+    rows on the requested page. `filter` takes a card query such as
+    `t:creature c>=ug cmc<=3` (see card_query) and narrows the matches; either
+    parameter may be used on its own.
+    """
+    query_param = request.args.get('q', '').strip()
+    filter_param = request.args.get('filter', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 100)
+    if not query_param and not filter_param:
+        return {"error": "Query parameter 'q' or 'filter' is required."}, 400
+    try:
+        card_filter = compile_query(filter_param)
+    except QuerySyntaxError as e:
+        return {"error": f"Invalid filter: {str(e)}"}, 400
+    try:
+        fields = Card.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    if query_param:
+        ts_query = func.websearch_to_tsquery('english', query_param)
+        rank = func.ts_rank_cd(Card.search_vector, ts_query).label('rank')
+        matches = db.session.query(Card.id, rank).filter(Card.search_vector.op('@@')(ts_query), card_filter)
+        snippet = func.ts_headline(
+            'english',
+            func.coalesce(func.nullif(Card.oracle_text, ''), Card.type_line, ''),
+            ts_query,
+            SEARCH_HEADLINE_OPTIONS
+        ).label('snippet')
+    else:
+        rank = literal(0.0).label('rank')
+        matches = db.session.query(Card.id, rank).filter(card_filter)
+        snippet = null().label('snippet')
+
+    total = matches.order_by(None).count()
+    page_rows = (
+        matches.order_by(rank.desc(), Card.name, Card.id)
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+        .subquery()
     )
 
-    cards = query.paginate(page=page, per_page=per_page, error_out=False)
+    rows = (
+        db.session.query(Card, page_rows.c.rank, snippet)
+        .options(load_only(*Card.field_columns(fields)))
+        .join(page_rows, Card.id == page_rows.c.id)
+        .order_by(page_rows.c.rank.desc(), Card.name, Card.id)
+        .all()
+    )
 
-    return jsonify({
-        'cards': [card.to_dict() for card in cards.items],
-        'total': cards.total,
-        'pages': cards.pages,
+    cards_data = []
+    for card, card_rank, card_snippet in rows:
+        card_data = card.to_dict(fields=fields)
+        card_data['rank'] = round(card_rank, 4)
+        card_data['snippet'] = card_snippet
+        cards_data.append(card_data)
+
+    return {
+        'cards': cards_data,
+        'total': total,
+        'pages': (total + per_page - 1) // per_page,
         'current_page': page
-    }), 200
+    }, 200
+
+@card_routes.route('/cards/autocomplete', methods=['GET'])
+@cache_response(timeout=3600, hard_timeout=86400, domains=('catalog',), local=True)
+def autocomplete_card_names():
+    """
+    Typeahead suggestions for card names.
+
+    Searches the card_names view (one row per oracle_id) so reprints don't
+    crowd out distinct cards. Prefix matches rank first, then fuzzy matches by
+    trigram word similarity, which tolerates typos and partial words.
+    """
+    query_param = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), AUTOCOMPLETE_MAX_LIMIT)
+    if not query_param:
+        return {"error": "Query parameter 'q' is required."}, 400
+
+    is_prefix = func.lower(CardName.name).like(f"{escape_like(query_param.lower())}%", escape='\\')
+    condition = is_prefix
+    if len(query_param) >= AUTOCOMPLETE_MIN_FUZZY_LENGTH:
+        # name %> q is served by the trigram index on card_names.name
+        condition = or_(is_prefix, CardName.name.op('%>')(query_param))
+    score = func.word_similarity(query_param, CardName.name).label('score')
+
+    rows = (
+        db.session.query(CardName, is_prefix.label('is_prefix'), score)
+        .filter(condition)
+        .order_by(is_prefix.desc(), score.desc(), CardName.printings.desc(), CardName.name)
+        .limit(limit)
+        .all()
+    )
+
+    suggestions = []
+    for card_name, prefix_match, card_score in rows:
+        suggestion = card_name.to_dict()
+        suggestion['score'] = round(card_score, 4)
+        suggestion['prefix_match'] = prefix_match
+        suggestions.append(suggestion)
+
+    return {'query': query_param, 'suggestions': suggestions}, 200
 
 @card_routes.route('/sets/<string:set_code>/cards', methods=['GET'])
-@cache_response()
+@cache_response(timeout=3600, hard_timeout=86400, domains=QUERY_DOMAINS, local=True,
+                formats=(MSGPACK_MIMETYPE, ARROW_MIMETYPE))
 def get_set_cards(set_code):
     try:
-        # Eagerly load related 'set' data to optimize queries
-        query = Card.query.options(
-            joinedload(Card.set)
-        ).filter(Card.set_code == set_code)
-
-        # Fetch all cards for the set without pagination
-        cards = query.all()
-
-        # Serialize card data
-        cards_data = [card.to_dict() for card in cards]
+        card_filter = compile_query(request.args.get('filter'))
+    except QuerySyntaxError as e:
+        return {"error": f"Invalid filter: {str(e)}"}, 400
+    try:
+        fields = Card.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
 
-        response = {
-            'cards': cards_data,
-            'total': len(cards_data)
-        }
+    try:
+        # Postgres builds the card array itself; no Card objects are created
+        cards_json, total = select_cards_json([Card.set_code == set_code, card_filter], fields)
 
-        return response, 200  # Return data directly
+        body = json_object(('cards', cards_json), ('total', total))
+        return current_app.response_class(body, status=200, mimetype='application/json')
     except Exception as e:
         logger.exception(f"Error in get_set_cards: {str(e)}")
         return {"error": "An error occurred while fetching the set cards."}, 500
 
 @card_routes.route('/cache_stats', methods=['GET'])
 def get_cache_stats():
-    total_calls = int(current_app.redis_client.get('cache_total_calls') or 0)
-    hits = int(current_app.redis_client.get('cache_hits') or 0)
-    misses = int(current_app.redis_client.get('cache_misses') or 0)
-
-    hit_rate = (hits / total_calls * 100) if total_calls > 0 else 0
-
-    response_times = current_app.redis_client.lrange('cache_response_times', 0, -1)
-    avg_response_time = sum(float(t) for t in response_times) / len(response_times) if response_times else 0
+    try:
+        return jsonify(collect_metrics())
+    except RedisError as e:
+        return jsonify({"error": f"Cache statistics unavailable: {str(e)}"}), 503
 
+@card_routes.route('/cache_stats', methods=['DELETE'])
+def reset_cache_stats():
+    try:
+        reset_metrics()
+    except RedisError as e:
+        return jsonify({"error": f"Cache statistics unavailable: {str(e)}"}), 503
+    return jsonify({"message": "Cache statistics reset."}), 200
+
+@card_routes.route('/cache_health', methods=['GET'])
+def get_cache_health():
+    """Report the Redis circuit breaker state and the local cache tier's usage."""
+    redis_client = current_app.redis_client
+    local_cache = current_app.local_cache
     return jsonify({
-        'total_calls': total_calls,
-        'hits': hits,
-        'misses': misses,
-        'hit_rate': f"{hit_rate:.2f}%",
-        'avg_response_time': f"{avg_response_time:.4f} seconds"
+        'redis': {
+            **redis_client.breaker.snapshot(),
+            'missed_invalidation': redis_client.missed_invalidation,
+            'recoveries': redis_client.recoveries
+        },
+        'local_cache': local_cache.snapshot() if local_cache else None
     })
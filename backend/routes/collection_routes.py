@@ -3,12 +3,18 @@ from models.card import Card
 from models.set import Set
 from models.set_collection_count import SetCollectionCount
 from database import db
-from sqlalchemy import func, or_, Float, distinct, text
+from sqlalchemy import func, and_, or_, Float, distinct, text
 from sqlalchemy.sql import asc, desc
+from sqlalchemy.orm import load_only
 from utils import safe_float, convert_decimals, cache_response, serialize_cards
 from errors import handle_error
 from schemas import UpdateCardSchema
 from stats import get_stats
+from cache import invalidate_cache
+from card_query import compile_query, QuerySyntaxError, QUERY_DOMAINS
+from pagination import keyset_paginate, InvalidCursorError
+from counts import paginate_counted, COUNT_MODES
+from card_serialization import select_card_rows
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,15 +22,19 @@ logger = logging.getLogger(__name__)
 collection_routes = Blueprint('collection_routes', __name__)
 
 @collection_routes.route('/collection', methods=['GET'])
-@cache_response()
+@cache_response(domains=('collection',))
 def get_collection():
     # Get pagination parameters from the request
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 50, type=int)
     set_code = request.args.get('set_code', '', type=str)
+    try:
+        fields = Card.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
 
-    # Base query to get cards
-    query = Card.query
+    # Base query to get cards, loading only the columns being serialized
+    query = Card.query.options(load_only(*Card.field_columns(fields)))
 
     # Filter by set code if provided
     if set_code:
@@ -33,21 +43,31 @@ def get_collection():
     # Only include cards that have quantity greater than zero in either regular or foil
     query = query.filter((Card.quantity_regular > 0) | (Card.quantity_foil > 0))
 
-    # Paginate the results
-    collection = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Cursor mode: ?cursor= for the first page, then the returned next/prev cursors
+    if 'cursor' in request.args:
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        try:
+            keyset_page = keyset_paginate(query, request.args.get('cursor'), per_page, include_total)
+        except InvalidCursorError as e:
+            return {"error": str(e)}, 400
+        return {'collection': serialize_cards(keyset_page.items, quantity_type='collection', fields=fields), **keyset_page.meta()}, 200
+
+    # Paginate the results; count=estimate|none skips the exact COUNT(*)
+    count_mode = request.args.get('count', 'exact')
+    if count_mode not in COUNT_MODES:
+        return {"error": f"Invalid count mode: {count_mode}. Use one of {', '.join(COUNT_MODES)}."}, 400
+    collection = paginate_counted(query, page, per_page, count_mode, ['collection'])
 
     # Serialize the collection to return as a response
     result = {
-        'collection': serialize_cards(collection.items, quantity_type='collection'),
-        'total': collection.total,
-        'pages': collection.pages,
-        'current_page': page
+        'collection': serialize_cards(collection.items, quantity_type='collection', fields=fields),
+        **collection.meta()
     }
 
     return result, 200
 
 @collection_routes.route('/collection/sets', methods=['GET'])
-@cache_response()
+@cache_response(timeout=900, hard_timeout=7200, domains=('collection',), local=True)
 def get_collection_sets():
     try:
         # Extract query parameters from the request
@@ -57,6 +77,9 @@ def get_collection_sets():
         per_page = request.args.get('per_page', 20, type=int)
         sort_by = request.args.get('sort_by', 'released_at', type=str)
         sort_order = request.args.get('sort_order', 'desc', type=str)
+        count_mode = request.args.get('count', 'exact', type=str)
+        if count_mode not in COUNT_MODES:
+            return {"error": f"Invalid count mode: {count_mode}. Use one of {', '.join(COUNT_MODES)}."}, 400
 
         # Log received parameters for debugging purposes
         logger.info(f"get_collection_sets: Received parameters: name={name}, set_types={set_types}, sort_by={sort_by}, sort_order={sort_order}, page={page}, per_page={per_page}")
@@ -118,8 +141,9 @@ def get_collection_sets():
         query = query.order_by(order_func(sort_column))
 
         # Execute the query with pagination
-        paginated_sets = query.paginate(page=page, per_page=per_page, error_out=False)
-        logger.info(f"get_collection_sets: Paginated sets: page={paginated_sets.page}, pages={paginated_sets.pages}, total={paginated_sets.total}")
+        paginated_sets = paginate_counted(query, page, per_page, count_mode, ['collection'])
+        pagination = paginated_sets.meta()
+        logger.info(f"get_collection_sets: Paginated sets: page={paginated_sets.page}, pages={pagination['pages']}, total={paginated_sets.total}")
 
         # Process results and serialize the set data
         sets_list = []
@@ -132,9 +156,7 @@ def get_collection_sets():
 
         response = {
             'sets': sets_list,
-            'total': paginated_sets.total,
-            'pages': paginated_sets.pages,
-            'current_page': paginated_sets.page
+            **pagination
         }
 
         # Convert any Decimal objects in the response to float
@@ -178,10 +200,8 @@ def update_collection(card_id):
         from models.set_collection_count import SetCollectionCount
         SetCollectionCount.refresh()
 
-        # Invalidate specific caches to ensure data consistency
-        current_app.redis_client.delete(f"collection:set:{old_set_code}")
-        current_app.redis_client.delete(f"collection_sets:{old_set_code}")
-        current_app.redis_client.delete("collection_stats")
+        # Invalidate cached collection pages for this card's set
+        invalidate_cache('collection', set_codes=[old_set_code])
 
         # Serialize updated card data
         card_data = card.to_dict()
@@ -197,71 +217,90 @@ def update_collection(card_id):
         return jsonify({"error": "An error occurred while updating the collection."}), 500
 
 @collection_routes.route('/collection/stats', methods=['GET'])
-@cache_response()
+@cache_response(domains=('collection',))
 def get_collection_stats():
     # Return collection statistics using predefined keys
-    return get_stats('quantity_collection_regular', 'quantity_collection_foil', 'collection_stats')
+    return get_stats('quantity_regular', 'quantity_foil', 'collection_stats')
 
-@collection_routes.route('/collection/sets/<string:set_code>/cards', methods=['GET'])
-@cache_response()
-def get_collection_set_cards(set_code):
-    # Extract query parameters from the request
+# Facet options offered by the set card filters in CollectionSetCards.vue
+FACET_RARITIES = ['common', 'uncommon', 'rare', 'mythic']
+FACET_COLORS = ['W', 'U', 'B', 'R', 'G', 'C']
+FACET_TYPES = ['Creature', 'Artifact', 'Enchantment', 'Instant', 'Sorcery', 'Planeswalker', 'Land', 'Battle']
+
+def colorless_condition():
+    return func.jsonb_array_length(func.coalesce(Card.colors, text("'[]'::jsonb"))) == 0
+
+def set_card_filters(set_code):
+    """
+    Build the set card listing filters from the request arguments.
+
+    Args:
+        set_code (str): The set being listed.
+
+    Returns:
+        Tuple[list, Dict[str, Any]]: Conditions that always apply (set, name,
+        keyword and the card query), and the facetable conditions keyed by
+        facet ('rarity', 'colors', 'types', 'ownership'), None when unused.
+
+    Raises:
+        ValueError: If a color or the card query is invalid.
+    """
     name = request.args.get('name', '', type=str)
     rarities = request.args.getlist('rarities') + request.args.getlist('rarities[]')
     colors = request.args.getlist('colors') + request.args.getlist('colors[]')
     types = request.args.getlist('types') + request.args.getlist('types[]')
     keyword = request.args.get('keyword', '', type=str)
     missing = request.args.get('missing', 'false', type=str).lower() == 'true'
+
+    # Card query language filter, applied on top of the individual parameters
+    try:
+        base = [Card.set_code == set_code, compile_query(request.args.get('filter'))]
+    except QuerySyntaxError as e:
+        raise ValueError(f"Invalid filter: {str(e)}")
+    if name:
+        base.append(Card.name.ilike(f'%{name}%'))
+    if keyword:
+        # Filter based on keyword presence in card keywords
+        base.append(Card.keywords.contains([keyword]))
+
+    facets = {'rarity': None, 'colors': None, 'types': None, 'ownership': None}
+    if rarities:
+        facets['rarity'] = Card.rarity.in_(rarities)
+    if colors:
+        invalid_colors = set(colors) - set(FACET_COLORS)
+        if invalid_colors:
+            raise ValueError(f"Invalid colors: {', '.join(sorted(invalid_colors))}")
+        # "C" selects colorless cards; any other color matches cards containing it
+        color_filters = [Card.colors.contains([color]) for color in colors if color != 'C']
+        if 'C' in colors:
+            color_filters.append(colorless_condition())
+        facets['colors'] = or_(*color_filters)
+    if types:
+        # Create filters for card types
+        facets['types'] = or_(*[Card.type_line.ilike(f'%{type_}%') for type_ in types])
+    if missing:
+        facets['ownership'] = (Card.quantity_regular == 0) & (Card.quantity_foil == 0)
+
+    return base, facets
+
+@collection_routes.route('/collection/sets/<string:set_code>/cards', methods=['GET'])
+@cache_response(domains=QUERY_DOMAINS, local=True)
+def get_collection_set_cards(set_code):
+    # Extract query parameters from the request
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 50, type=int)
 
     try:
-        # Base query to get cards from a specific set
-        query = Card.query.filter(Card.set_code == set_code)
+        base_filters, facet_filters = set_card_filters(set_code)
+        fields = Card.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Apply filters if provided
-        if name:
-            query = query.filter(Card.name.ilike(f'%{name}%'))
-        if rarities:
-            query = query.filter(Card.rarity.in_(rarities))
-        if colors:
-            # Define valid colors and ensure there are no invalid values
-            VALID_COLORS = {'W', 'U', 'B', 'R', 'G', 'C'}
-            invalid_colors = set(colors) - VALID_COLORS
-            if invalid_colors:
-                return jsonify({"error": f"Invalid colors: {', '.join(invalid_colors)}"}), 400
-
-            # Handle "C" for colorless cards
-            if 'C' in colors:
-                colors.remove('C')
-                # Filter for colorless cards where the 'colors' array is empty
-                colorless_filter = func.jsonb_array_length(Card.colors) == 0
-            else:
-                colorless_filter = None
-
-            # Build the colors filter for colored cards
-            if colors:
-                colors_filter = Card.colors.overlap(colors)
-                if colorless_filter is not None:
-                    final_colors_filter = or_(colors_filter, colorless_filter)
-                else:
-                    final_colors_filter = colors_filter
-            else:
-                # Only colorless cards are selected
-                final_colors_filter = colorless_filter
-
-            # Apply the final colors filter
-            if final_colors_filter is not None:
-                query = query.filter(final_colors_filter)
-        if types:
-            # Create filters for card types
-            type_filters = [Card.type_line.ilike(f'%{type_}%') for type_ in types]
-            query = query.filter(or_(*type_filters))
-        if keyword:
-            # Filter based on keyword presence in card keywords
-            query = query.filter(Card.keywords.contains([keyword]))
-        if missing:
-            query = query.filter((Card.quantity_regular == 0) & (Card.quantity_foil == 0))
+    try:
+        # Base query to get cards from a specific set
+        query = Card.query.options(load_only(*Card.field_columns(fields))).filter(
+            *base_filters, *(f for f in facet_filters.values() if f is not None)
+        )
 
         # Order cards by their collector number, converting to an integer to ensure proper sorting
         query = query.order_by(func.cast(func.regexp_replace(Card.collector_number, '[^0-9]', '', 'g'), db.Integer))
@@ -271,7 +310,7 @@ def get_collection_set_cards(set_code):
 
         # Serialize the result
         result = {
-            'cards': [card.to_dict() for card in paginated_cards.items],
+            'cards': [card.to_dict(fields=fields) for card in paginated_cards.items],
             'total': paginated_cards.total,
             'pages': paginated_cards.pages,
             'current_page': paginated_cards.page
@@ -283,9 +322,73 @@ def get_collection_set_cards(set_code):
         logger.exception(error_message)
         return jsonify({"error": error_message}), 500
 
+@collection_routes.route('/collection/sets/<string:set_code>/cards/facets', methods=['GET'])
+@cache_response(domains=QUERY_DOMAINS, local=True)
+def get_collection_set_card_facets(set_code):
+    """
+    Count how many cards each set card filter option would match.
+
+    Takes the same arguments as get_collection_set_cards and computes every
+    facet in one pass with COUNT(*) FILTER aggregates. Each facet's counts
+    apply all the other active filters but not its own, so selecting a rarity
+    still shows the counts of the other rarities.
+    """
+    try:
+        base_filters, facet_filters = set_card_filters(set_code)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    def others(facet):
+        return [f for name, f in facet_filters.items() if name != facet and f is not None]
+
+    def count_where(facet, *conditions):
+        conditions = [*conditions, *others(facet)]
+        return func.count().filter(and_(*conditions)) if conditions else func.count()
+
+    owned = (Card.quantity_regular > 0) | (Card.quantity_foil > 0)
+    missing = (Card.quantity_regular == 0) & (Card.quantity_foil == 0)
+    columns = {
+        ('total', None): count_where(None),
+        **{('rarity', rarity): count_where('rarity', Card.rarity == rarity) for rarity in FACET_RARITIES},
+        **{('colors', color): count_where('colors', colorless_condition() if color == 'C' else Card.colors.contains([color]))
+           for color in FACET_COLORS},
+        **{('types', type_): count_where('types', Card.type_line.ilike(f'%{type_}%')) for type_ in FACET_TYPES},
+        ('ownership', 'owned'): count_where('ownership', owned),
+        ('ownership', 'missing'): count_where('ownership', missing),
+        ('finish', 'regular'): count_where(None, Card.quantity_regular > 0),
+        ('finish', 'foil'): count_where(None, Card.quantity_foil > 0),
+    }
+
+    try:
+        row = db.session.query(*columns.values()).filter(*base_filters).one()
+    except Exception as e:
+        logger.exception(f"Error in get_collection_set_card_facets: {str(e)}")
+        return {"error": "An error occurred while counting the set card facets."}, 500
+
+    facets = {'rarity': {}, 'colors': {}, 'types': {}, 'ownership': {}, 'finish': {}}
+    total = 0
+    for (facet, option), count in zip(columns, row):
+        if facet == 'total':
+            total = count
+        else:
+            facets[facet][option] = count
+
+    return {'set_code': set_code, 'total': total, 'facets': facets}, 200
+
+# Card keys get_collection_set needs for its totals and statistics
+SET_STATISTICS_FIELDS = (
+    'prices', 'quantity_regular', 'quantity_foil', 'frame_effects', 'promo_types',
+    'promo', 'reprint', 'variation', 'oversized',
+)
+
 @collection_routes.route('/collection/sets/<string:set_code>', methods=['GET'])
-# @cache_response()
+# @cache_response(domains=('collection',))
 def get_collection_set(set_code):
+    try:
+        fields = Card.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
     try:
         # Fetch the set instance by set code
         set_instance = Set.query.filter_by(code=set_code).first()
@@ -295,9 +398,10 @@ def get_collection_set(set_code):
         # Serialize set data
         set_data = set_instance.to_dict()
 
-        # Fetch cards for this set
-        cards = Card.query.filter_by(set_code=set_code).all()
-        set_data['cards'] = [card.to_dict() for card in cards]
+        # Fetch cards for this set as plain dicts (Core select, no ORM objects),
+        # with the keys the statistics below read even when fields= leaves them out
+        selected = fields and tuple(dict.fromkeys(fields + SET_STATISTICS_FIELDS))
+        cards = select_card_rows([Card.set_code == set_code], selected)
 
         # Initialize statistics dictionary
         statistics = {
@@ -316,27 +420,27 @@ def get_collection_set(set_code):
 
         # Calculate collection statistics and card values
         for card in cards:
-            collection_count += card.quantity_regular + card.quantity_foil
+            collection_count += card['quantity_regular'] + card['quantity_foil']
 
             # Calculate total value for regular and foil cards
-            regular_value = float(card.prices.get('usd', 0) or 0) * card.quantity_regular
-            foil_value = float(card.prices.get('usd_foil', 0) or 0) * card.quantity_foil
+            regular_value = float((card['prices'] or {}).get('usd', 0) or 0) * card['quantity_regular']
+            foil_value = float((card['prices'] or {}).get('usd_foil', 0) or 0) * card['quantity_foil']
             total_value += regular_value + foil_value
 
             # Update statistics for frame effects, promo types, and other attributes
-            if card.frame_effects:
-                for effect in card.frame_effects:
+            if card['frame_effects']:
+                for effect in card['frame_effects']:
                     statistics['frame_effects'][effect] = statistics['frame_effects'].get(effect, 0) + 1
-            if card.promo_types:
-                for promo_type in card.promo_types:
+            if card['promo_types']:
+                for promo_type in card['promo_types']:
                     statistics['promo_types'][promo_type] = statistics['promo_types'].get(promo_type, 0) + 1
-            if card.promo:
+            if card['promo']:
                 statistics['other_attributes']['promo'] += 1
-            if card.reprint:
+            if card['reprint']:
                 statistics['other_attributes']['reprint'] += 1
-            if card.variation:
+            if card['variation']:
                 statistics['other_attributes']['variation'] += 1
-            if card.oversized:
+            if card['oversized']:
                 statistics['other_attributes']['oversized'] += 1
 
         # Update set data with collection count, percentage, total value, and statistics
@@ -344,6 +448,7 @@ def get_collection_set(set_code):
         set_data['collection_percentage'] = (collection_count / set_instance.card_count) * 100 if set_instance.card_count else 0
         set_data['total_value'] = round(total_value, 2)
         set_data['statistics'] = statistics
+        set_data['cards'] = [{field: card[field] for field in fields} for card in cards] if fields else cards
 
         # Log the statistics for debugging
         print(f"Statistics for set {set_code}: {statistics}")
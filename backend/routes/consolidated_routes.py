@@ -3,22 +3,30 @@ from models.card import Card
 from models.set import Set
 from database import db
 from sqlalchemy import or_
+from sqlalchemy.orm import load_only
 from utils import cache_response, serialize_cards
 from errors import handle_error
+from pagination import keyset_paginate, InvalidCursorError
+from formats import MSGPACK_MIMETYPE, ARROW_MIMETYPE
 
 consolidated_routes = Blueprint('consolidated_routes', __name__)
 
 @consolidated_routes.route('/v2/cards', methods=['GET'])
-@cache_response()
+@cache_response(domains=('collection', 'kiosk'), formats=(MSGPACK_MIMETYPE, ARROW_MIMETYPE))
 def get_cards_v2():
     set_code = request.args.get('set_code')
     source = request.args.get('source')
     include_set_details = request.args.get('include_set_details', 'false').lower() == 'true'
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 50, type=int)
+    quantity_type = source if source else 'default'
+    try:
+        fields = Card.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
 
-    # Build the base query
-    query = Card.query
+    # Build the base query, loading only the columns being serialized
+    query = Card.query.options(load_only(*Card.field_columns(fields, quantity_type)))
 
     if set_code:
         query = query.filter(Card.set_code == set_code)
@@ -33,21 +41,32 @@ def get_cards_v2():
     current_app.logger.info(f"Parameters - set_code: {set_code}, source: {source}, include_set_details: {include_set_details}, page: {page}, per_page: {per_page}")
 
     try:
-        # Execute the query with pagination
-        cards = query.paginate(page=page, per_page=per_page, error_out=False)
+        if 'cursor' in request.args:
+            # Cursor mode: ?cursor= for the first page, then the returned next/prev cursors
+            include_total = request.args.get('include_total', 'false').lower() == 'true'
+            keyset_page = keyset_paginate(query, request.args.get('cursor'), per_page, include_total)
+            items = keyset_page.items
+            pagination = keyset_page.meta()
+        else:
+            # Execute the query with pagination
+            cards = query.paginate(page=page, per_page=per_page, error_out=False)
+            items = cards.items
+            pagination = {
+                'total': cards.total,
+                'pages': cards.pages,
+                'current_page': page
+            }
 
         # Logging for debugging purposes
-        if not cards.items:
+        if not items:
             current_app.logger.warning(f"No cards found for set_code={set_code} and source={source}")
         else:
-            current_app.logger.info(f"Cards found: {len(cards.items)} for set_code={set_code} and source={source}")
+            current_app.logger.info(f"Cards found: {len(items)} for set_code={set_code} and source={source}")
 
         # Serialize cards
         result = {
-            'cards': serialize_cards(cards.items, quantity_type=source if source else 'default'),
-            'total': cards.total,
-            'pages': cards.pages,
-            'current_page': page
+            'cards': serialize_cards(items, quantity_type=quantity_type, fields=fields),
+            **pagination
         }
 
         # Add set details if requested and available
@@ -59,6 +78,8 @@ def get_cards_v2():
                 current_app.logger.warning(f"No set details found for set_code={set_code}")
 
         return jsonify(result), 200
+    except InvalidCursorError as e:
+        return {"error": str(e)}, 400
     except Exception as e:
         current_app.logger.error(f"Error while executing query: {e}")
         return {"error": "An error occurred while fetching the cards."}, 500
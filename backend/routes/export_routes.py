@@ -0,0 +1,111 @@
+import csv
+import io
+import logging
+from datetime import date
+from flask import Blueprint, jsonify, request, current_app, stream_with_context
+from sqlalchemy import select
+from models.card import Card
+from database import db
+from utils import orjson_default
+from inventory_import import CSV_COLUMNS
+import orjson
+
+export_routes = Blueprint('export_routes', __name__)
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Quantity columns of each inventory, as (regular, foil)
+INVENTORY_COLUMNS = {
+    'collection': (Card.quantity_regular, Card.quantity_foil),
+    'kiosk': (Card.quantity_kiosk_regular, Card.quantity_kiosk_foil),
+}
+
+def inventory_rows(inventory):
+    """
+    Stream the owned printings of an inventory as import-layout records.
+
+    A server-side cursor fetches EXPORT_BATCH_SIZE cards at a time, in the
+    keyset index order, and each card yields one record per finish it is held in.
+
+    Args:
+        inventory (str): 'collection' or 'kiosk'.
+
+    Yields:
+        List[dict]: One batch of records keyed by CSV_COLUMNS.
+    """
+    regular_column, foil_column = INVENTORY_COLUMNS[inventory]
+    statement = (
+        select(
+            Card.id, Card.name, Card.set_name, Card.set_code, Card.collector_number,
+            Card.prices['usd'].astext, Card.prices['usd_foil'].astext,
+            regular_column, foil_column
+        )
+        .where((regular_column > 0) | (foil_column > 0))
+        .order_by(Card.set_code, Card.collector_sort_key, Card.id)
+        .execution_options(stream_results=True, yield_per=current_app.config['EXPORT_BATCH_SIZE'])
+    )
+    result = db.session.execute(statement)
+    try:
+        for partition in result.partitions():
+            batch = []
+            for card_id, name, set_name, set_code, collector_number, usd, usd_foil, regular, foil in partition:
+                for is_foil, quantity, price in ((False, regular, usd), (True, foil, usd_foil)):
+                    if quantity and quantity > 0:
+                        batch.append({
+                            'Name': name,
+                            'Edition': set_name,
+                            'Edition code': set_code,
+                            "Collector's number": collector_number,
+                            'Price': price,
+                            'Foil': is_foil,
+                            'Currency': 'USD',
+                            'Scryfall ID': card_id,
+                            'Quantity': quantity,
+                        })
+            yield batch
+    finally:
+        result.close()
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # The header alone when the inventory is empty
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def ndjson_chunks(batches):
+    for batch in batches:
+        yield b''.join(orjson.dumps(record, default=orjson_default) + b'\n' for record in batch)
+
+def export_response(inventory):
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Invalid format: {export_format}. Use one of {', '.join(EXPORT_FORMATS)}."}), 400
+
+    logger.info(f"Streaming {inventory} export as {export_format}")
+    batches = inventory_rows(inventory)
+    chunks = csv_chunks(batches) if export_format == 'csv' else ndjson_chunks(batches)
+    response = current_app.response_class(stream_with_context(chunks), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename="{inventory}-{date.today().isoformat()}.{export_format}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@export_routes.route('/collection/export', methods=['GET'])
+def export_collection():
+    """Stream the whole collection as CSV (default) or NDJSON, in the import column layout."""
+    return export_response('collection')
+
+@export_routes.route('/kiosk/export', methods=['GET'])
+def export_kiosk():
+    """Stream the whole kiosk inventory as CSV (default) or NDJSON, in the import column layout."""
+    return export_response('kiosk')
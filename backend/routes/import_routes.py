@@ -1,9 +1,10 @@
-import pandas as pd
 import logging
-from flask import Blueprint, jsonify, request, current_app
-from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from models.card import Card
+from flask import Blueprint, jsonify, request
+from sqlalchemy.exc import SQLAlchemyError
 from database import db
+from models.import_record import ImportRecord
+from inventory_import import check_import_header
+from import_jobs import enqueue_import, expire_stale_imports, undo_import, DuplicateImportError, ImportStateError
 
 import_routes = Blueprint('import_routes', __name__)
 
@@ -13,94 +14,27 @@ logger = logging.getLogger(__name__)
 
 @import_routes.route('/kiosk/import_csv', methods=['POST'])
 def import_kiosk_csv():
-    if 'file' not in request.files:
-        return jsonify({"error": "No file part in the request"}), 400
-
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({"error": "No file selected"}), 400
-
-    if not file.filename.endswith('.csv'):
-        return jsonify({"error": "Only CSV files are allowed"}), 400
-
-    try:
-        df = pd.read_csv(file)
-    except Exception as e:
-        logger.error(f"Failed to parse CSV: {str(e)}")
-        return jsonify({"error": f"Failed to parse CSV: {str(e)}"}), 400
-
-    required_columns = {
-        'Name', 'Edition', 'Edition code', "Collector's number",
-        'Price', 'Foil', 'Currency', 'Scryfall ID', 'Quantity'
-    }
-    if not required_columns.issubset(set(df.columns)):
-        missing = required_columns - set(df.columns)
-        return jsonify({"error": f"CSV is missing columns: {', '.join(missing)}"}), 400
-
-    df['Foil'] = df['Foil'].fillna(False).replace('', False)
+    return import_csv('kiosk')
 
-    try:
-        with db.session.begin_nested():
-            for index, row in df.iterrows():
-                try:
-                    process_kiosk_csv_row(row, index)
-                except ValueError as e:
-                    logger.error(f"Error processing row {index + 2}: {str(e)}")
-                    continue
-                except IntegrityError as e:
-                    logger.error(f"IntegrityError at row {index + 2}: {str(e)}")
-                    db.session.rollback()
-                    return jsonify({"error": f"Database integrity error at row {index + 2}: {str(e)}"}), 500
-
-                if index % 100 == 0:
-                    db.session.flush()
-
-        db.session.commit()
-        logger.info("CSV imported successfully")
-
-        # Invalidate related caches
-        current_app.redis_client.delete("kiosk:*")
-        current_app.redis_client.delete("kiosk_sets:*")
-        current_app.redis_client.delete("kiosk_stats")
-
-        return jsonify({"message": "CSV imported successfully"}), 200
-
-    except SQLAlchemyError as e:
-        db.session.rollback()
-        logger.error(f"Database error during CSV import: {str(e)}")
-        return jsonify({"error": f"Database error: {str(e)}"}), 500
-
-def process_kiosk_csv_row(row, index):
-    scryfall_id = row['Scryfall ID']
-    card_name = row['Name']
-
-    try:
-        quantity = int(row['Quantity'])
-        if quantity < 1:
-            raise ValueError(f"Invalid quantity for card '{card_name}' at row {index + 2}.")
-    except ValueError:
-        raise ValueError(f"Invalid quantity for card '{card_name}' at row {index + 2}.")
-
-    foil = row['Foil']
-    if isinstance(foil, bool):
-        foil_status = foil
-    else:
-        raise ValueError(f"Foil value must be boolean for card '{card_name}' at row {index + 2}.")
-
-    card = Card.query.filter_by(id=scryfall_id).first()
-    if not card:
-        raise ValueError(f"Card with Scryfall ID '{scryfall_id}' not found in the database.")
+@import_routes.route('/collection/import_csv', methods=['POST'])
+def import_collection_csv():
+    return import_csv('collection')
 
-    if foil_status:
-        card.quantity_kiosk_foil += quantity
-    else:
-        card.quantity_kiosk_regular += quantity
+def import_csv(inventory):
+    """
+    Queue an uploaded CSV for import into an inventory.
 
-    db.session.add(card)
+    Only the header is checked here; a background worker parses and applies
+    the rows and records its progress on the returned ImportRecord, which
+    clients poll through get_import. A file whose content was already imported
+    into the inventory is refused with a 409 unless `force=true` is passed.
 
+    Args:
+        inventory (str): 'collection' or 'kiosk'.
 
-@import_routes.route('/collection/import_csv', methods=['POST'])
-def import_collection_csv():
+    Returns:
+        Tuple[Response, int]: The queued import and a 202, or an error.
+    """
     if 'file' not in request.files:
         return jsonify({"error": "No file part in the request"}), 400
 
@@ -112,66 +46,54 @@ def import_collection_csv():
         return jsonify({"error": "Only CSV files are allowed"}), 400
 
     try:
-        df = pd.read_csv(file)
-        logger.info(f"import_collection_csv: Successfully parsed CSV file: {file.filename}")
-    except Exception as e:
-        logger.error(f"import_collection_csv: Failed to parse CSV: {str(e)}")
-        return jsonify({"error": f"Failed to parse CSV: {str(e)}"}), 400
-
-    required_columns = {
-        'Name', 'Edition', 'Edition code', "Collector's number",
-        'Price', 'Foil', 'Currency', 'Scryfall ID', 'Quantity'
-    }
-    if not required_columns.issubset(set(df.columns)):
-        missing = required_columns - set(df.columns)
-        logger.error(f"import_collection_csv: CSV is missing columns: {', '.join(missing)}")
-        return jsonify({"error": f"CSV is missing columns: {', '.join(missing)}"}), 400
-
-    df['Foil'] = df['Foil'].fillna(False).replace('', False)
-    logger.debug("import_collection_csv: Preprocessed 'Foil' column in CSV")
+        check_import_header(file.stream)
+        file.stream.seek(0)
+    except ValueError as e:
+        logger.error(f"import_csv: {str(e)}")
+        return jsonify({"error": str(e)}), 400
 
+    force = request.args.get('force', 'false').lower() == 'true'
+    try:
+        record = enqueue_import(file, inventory, force=force)
+    except DuplicateImportError as e:
+        logger.info(f"import_csv: Skipped duplicate {inventory} upload of {file.filename}")
+        return jsonify({"error": str(e), "duplicate_of": e.existing.to_dict()}), 409
+    except (SQLAlchemyError, OSError) as e:
+        db.session.rollback()
+        logger.error(f"import_csv: Failed to queue {inventory} CSV import: {str(e)}")
+        return jsonify({"error": "Failed to queue the import. Please try again later."}), 500
+
+    return jsonify({
+        "message": "CSV import queued",
+        **record.to_dict(),
+        "status_url": f"/api/imports/{record.id}"
+    }), 202
+
+@import_routes.route('/imports/<string:import_id>', methods=['GET'])
+def get_import(import_id):
+    """Progress and, once finished, the per-row error report of a CSV import."""
     try:
-        updates = process_collection_csv(df)
-        db.session.bulk_update_mappings(Card, updates)
+        expire_stale_imports()
         db.session.commit()
-        logger.info(f"import_collection_csv: Successfully imported CSV with {len(updates)} updates")
-
-        # Invalidate related caches
-        current_app.redis_client.delete("collection:*")
-        current_app.redis_client.delete("collection_sets:*")
-        current_app.redis_client.delete("collection_stats")
-        logger.debug("import_collection_csv: Invalidated related caches")
-
-        return jsonify({"message": "CSV imported successfully", "updates": len(updates)}), 200
-
-    except ValueError as e:
-        logger.error(f"import_collection_csv: Error processing CSV: {str(e)}")
-        return jsonify({"error": str(e)}), 400
     except SQLAlchemyError as e:
         db.session.rollback()
-        logger.error(f"import_collection_csv: Database error during CSV import: {str(e)}")
+        logger.error(f"get_import: Could not expire stale imports: {str(e)}")
+    record = db.session.get(ImportRecord, import_id)
+    if record is None:
+        return jsonify({"error": "Import not found"}), 404
+    return jsonify(record.to_dict()), 200
+
+@import_routes.route('/imports/<string:import_id>/undo', methods=['POST'])
+def undo_import_route(import_id):
+    """Reverse the quantities a finished import applied."""
+    try:
+        record = undo_import(import_id)
+    except ImportStateError as e:
+        return jsonify({"error": str(e)}), 409
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"undo_import: Database error undoing import {import_id}: {str(e)}")
         return jsonify({"error": "A database error occurred. Please try again later."}), 500
-
-def process_collection_csv(df):
-    updates = []
-    for index, row in df.iterrows():
-        scryfall_id = row['Scryfall ID']
-        card_name = row['Name']
-        try:
-            quantity = int(row['Quantity'])
-            if quantity < 1:
-                raise ValueError(f"Invalid quantity for card '{card_name}' at row {index + 2}.")
-        except ValueError:
-            raise ValueError(f"Invalid quantity for card '{card_name}' at row {index + 2}.")
-
-        foil = row['Foil']
-        if not isinstance(foil, bool):
-            raise ValueError(f"Foil value must be boolean for card '{card_name}' at row {index + 2}.")
-
-        updates.append({
-            'id': scryfall_id,
-            'quantity_foil': db.func.coalesce(Card.quantity_foil, 0) + (quantity if foil else 0),
-            'quantity_regular': db.func.coalesce(Card.quantity_regular, 0) + (quantity if not foil else 0)
-        })
-
-    return updates
+    if record is None:
+        return jsonify({"error": "Import not found"}), 404
+    return jsonify({"message": "Import undone", **record.to_dict()}), 200
@@ -1,11 +1,17 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request
 from models.card import Card
 from models.set import Set
 from database import db
 from sqlalchemy import func, distinct, text, Float
+from sqlalchemy.orm import load_only
 from utils import safe_float, convert_decimals, cache_response, serialize_cards
 from errors import handle_error
 from schemas import UpdateCardSchema
+from cache import invalidate_cache
+from card_query import compile_query, QuerySyntaxError, QUERY_DOMAINS
+from pagination import keyset_paginate, InvalidCursorError
+from counts import paginate_counted, COUNT_MODES
+from formats import MSGPACK_MIMETYPE, ARROW_MIMETYPE
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,41 +19,42 @@ logger = logging.getLogger(__name__)
 kiosk_routes = Blueprint('kiosk_routes', __name__)
 
 @kiosk_routes.route('/kiosk', methods=['GET'])
-@cache_response()
+@cache_response(domains=('kiosk',))
 def get_kiosk():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
+    try:
+        fields = Card.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
 
-    cache_key = f"kiosk:page:{page}:per_page:{per_page}"
-    cached_data = current_app.redis_client.get(cache_key)
+    query = Card.query.options(load_only(*Card.field_columns(fields, 'kiosk'))).filter(
+        (Card.quantity_kiosk_regular > 0) | (Card.quantity_kiosk_foil > 0)
+    )
 
-    if cached_data:
-        return current_app.response_class(
-            response=cached_data.decode(),
-            status=200,
-            mimetype='application/json'
-        )
+    # Cursor mode: ?cursor= for the first page, then the returned next/prev cursors
+    if 'cursor' in request.args:
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        try:
+            keyset_page = keyset_paginate(query, request.args.get('cursor'), per_page, include_total)
+        except InvalidCursorError as e:
+            return {"error": str(e)}, 400
+        return {'kiosk': serialize_cards(keyset_page.items, quantity_type='kiosk', fields=fields), **keyset_page.meta()}, 200
 
-    kiosk = Card.query.filter((Card.quantity_kiosk_regular > 0) | (Card.quantity_kiosk_foil > 0)).paginate(page=page, per_page=per_page, error_out=False)
+    count_mode = request.args.get('count', 'exact')
+    if count_mode not in COUNT_MODES:
+        return {"error": f"Invalid count mode: {count_mode}. Use one of {', '.join(COUNT_MODES)}."}, 400
+    kiosk = paginate_counted(query, page, per_page, count_mode, ['kiosk'])
 
     result = {
-        'kiosk': serialize_cards(kiosk.items, quantity_type='kiosk'),
-        'total': kiosk.total,
-        'pages': kiosk.pages,
-        'current_page': page
+        'kiosk': serialize_cards(kiosk.items, quantity_type='kiosk', fields=fields),
+        **kiosk.meta()
     }
 
-    serialized_data = current_app.json.dumps(result)
-    current_app.redis_client.setex(cache_key, 300, serialized_data)  # Cache for 5 minutes
-
-    return current_app.response_class(
-        response=serialized_data,
-        status=200,
-        mimetype='application/json'
-    )
+    return result, 200
 
 @kiosk_routes.route('/kiosk/sets', methods=['GET'])
-@cache_response()
+@cache_response(domains=('kiosk',))
 def get_kiosk_sets():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
@@ -110,16 +117,24 @@ def get_kiosk_sets():
         return handle_error(500, f"An unexpected error occurred while fetching kiosk stats: {str(e)}", "Internal Server Error")
 
 @kiosk_routes.route('/kiosk/sets/<string:set_code>/cards', methods=['GET'])
-@cache_response()
+@cache_response(domains=QUERY_DOMAINS, local=True, formats=(MSGPACK_MIMETYPE, ARROW_MIMETYPE))
 def get_kiosk_set_cards(set_code):
     name_filter = request.args.get('name', '')
     rarity_filter = request.args.get('rarity', '')
     sort_by = request.args.get('sortBy', 'name')
     sort_order = request.args.get('sortOrder', 'asc')
+    try:
+        card_filter = compile_query(request.args.get('filter'))
+    except QuerySyntaxError as e:
+        return {"error": f"Invalid filter: {str(e)}"}, 400
+    try:
+        fields = Card.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
 
-    query = Card.query.filter(Card.set_code == set_code).filter(
+    query = Card.query.options(load_only(*Card.field_columns(fields, 'kiosk'))).filter(Card.set_code == set_code).filter(
         (Card.quantity_kiosk_regular > 0) | (Card.quantity_kiosk_foil > 0)
-    )
+    ).filter(card_filter)
 
     if name_filter:
         query = query.filter(Card.name.ilike(f'%{name_filter}%'))
@@ -132,7 +147,7 @@ def get_kiosk_set_cards(set_code):
         query = query.order_by(getattr(Card, sort_by))
 
     cards = query.all()
-    cards_data = serialize_cards(cards, quantity_type='kiosk')
+    cards_data = serialize_cards(cards, quantity_type='kiosk', fields=fields)
 
     set_instance = Set.query.filter_by(code=set_code).first()
     set_name = set_instance.name if set_instance else ''
@@ -164,14 +179,12 @@ def update_kiosk(card_id):
 
     db.session.commit()
 
-    current_app.redis_client.delete("kiosk:*")
-    current_app.redis_client.delete("kiosk_sets:*")
-    current_app.redis_client.delete(f"kiosk_set_cards:{card.set_code}:*")
+    invalidate_cache('kiosk', set_codes=[card.set_code])
 
     return jsonify(card.to_dict()), 200
 
 @kiosk_routes.route('/kiosk/stats', methods=['GET'])
-@cache_response()
+@cache_response(domains=('kiosk',))
 def get_kiosk_stats():
     try:
         total_cards = db.session.query(func.sum(Card.quantity_kiosk_regular + Card.quantity_kiosk_foil)).scalar() or 0
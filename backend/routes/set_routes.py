@@ -4,7 +4,7 @@ from models.card import Card
 from models.set_collection_count import SetCollectionCount
 from database import db
 from sqlalchemy import asc, desc, func, Float, Integer, text
-from sqlalchemy.orm import joinedload, subqueryload, load_only
+from sqlalchemy.orm import load_only
 from sqlalchemy.exc import SQLAlchemyError
 from collections import defaultdict
 from decimal import Decimal
@@ -12,6 +12,9 @@ import orjson
 import logging
 from datetime import datetime
 from utils import cache_response, convert_decimals
+from card_query import compile_query, QuerySyntaxError, QUERY_DOMAINS
+from card_serialization import select_cards_json, json_object
+from formats import MSGPACK_MIMETYPE, ARROW_MIMETYPE
 
 set_routes = Blueprint('set_routes', __name__)
 logger = logging.getLogger(__name__)
@@ -19,26 +22,24 @@ logger = logging.getLogger(__name__)
 
 
 @set_routes.route('/<string:set_code>/cards', methods=['GET'])
-@cache_response()
+@cache_response(timeout=3600, hard_timeout=86400, domains=QUERY_DOMAINS, local=True,
+                formats=(MSGPACK_MIMETYPE, ARROW_MIMETYPE))
 def get_set_cards(set_code):
     try:
-        # Eagerly load related 'set' data to optimize queries
-        query = Card.query.options(
-            joinedload(Card.set)
-        ).filter(Card.set_code == set_code)
-
-        # Fetch all cards for the set without pagination
-        cards = query.all()
-
-        # Serialize card data
-        cards_data = [card.to_dict() for card in cards]
+        card_filter = compile_query(request.args.get('filter'))
+    except QuerySyntaxError as e:
+        return {"error": f"Invalid filter: {str(e)}"}, 400
+    try:
+        fields = Card.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
 
-        response = {
-            'cards': cards_data,
-            'total': len(cards_data)
-        }
+    try:
+        # Postgres builds the card array itself; no Card objects are created
+        cards_json, total = select_cards_json([Card.set_code == set_code, card_filter], fields)
 
-        return response, 200  # Correct variable name
+        body = json_object(('cards', cards_json), ('total', total))
+        return current_app.response_class(body, status=200, mimetype='application/json')
     except Exception as e:
         logger.exception(f"Error in get_set_cards: {str(e)}")
         return {"error": "An error occurred while fetching the set cards."}, 500
@@ -48,8 +49,13 @@ from sqlalchemy.dialects.postgresql import JSONB
 
 
 @set_routes.route('/<string:set_code>/details', methods=['GET'])
-@cache_response()
+@cache_response(domains=('collection',), local=True)
 def get_collection_set_details(set_code):
+    try:
+        fields = Card.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
     try:
         logger.info(f"Fetching details for set with code: {set_code}")
         # Fetch the set instance
@@ -58,30 +64,13 @@ def get_collection_set_details(set_code):
             logger.warning(f"Set with code {set_code} not found")
             return {"error": "Set not found."}, 404
 
-        # Query cards with necessary attributes
-        query = Card.query.options(load_only(
-            Card.id,
-            Card.name,
-            Card.type_line,
-            Card.mana_cost,
-            Card.rarity,
-            Card.image_uris,
-            Card.collector_number,
-            Card.prices,
-            Card.quantity_regular,
-            Card.quantity_foil,
-            Card.frame_effects,
-            Card.promo_types,
-            Card.promo,
-            Card.reprint,
-            Card.variation,
-            Card.oversized
-        )).filter(Card.set_code == set_code)
+        # Query only the columns being serialized
+        query = Card.query.options(load_only(*Card.field_columns(fields))).filter(Card.set_code == set_code)
 
         cards = query.all()
 
         # Serialize cards
-        cards_data = [card.to_dict() for card in cards]
+        cards_data = [card.to_dict(fields=fields) for card in cards]
 
         # Build response
         response = {
@@ -101,8 +90,13 @@ def get_collection_set_details(set_code):
 
 
 @set_routes.route('/<string:set_code>', methods=['GET'])
-@cache_response()
+@cache_response(timeout=3600, hard_timeout=86400, domains=('collection',), local=True)
 def get_set(set_code):
+    try:
+        fields = Card.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
     try:
         set_instance = Set.query.filter_by(code=set_code).first()
         if not set_instance:
@@ -110,23 +104,18 @@ def get_set(set_code):
 
         set_data = set_instance.to_dict()
 
-        # Fetch cards for this set
-        cards = Card.query.filter_by(set_code=set_code).all()
-        cards_data = [card.to_dict() for card in cards]
-
-        response = {
-            "set": set_data,
-            "cards": cards_data
-        }
+        # Fetch cards for this set as a JSON array built by Postgres
+        cards_json, _ = select_cards_json([Card.set_code == set_code], fields)
 
-        return response, 200  # Return as a tuple
+        body = json_object(("set", set_data), ("cards", cards_json))
+        return current_app.response_class(body, status=200, mimetype='application/json')
     except Exception as e:
         error_message = f"An error occurred while fetching the set: {str(e)}"
         logger.exception(error_message)
         return {"error": error_message}, 500
 
 @set_routes.route('/api/sets/<string:set_code>', methods=['GET'])
-@cache_response()
+@cache_response(domains=('collection',))
 def get_set_api(set_code):
-    response = get_set(set_code)
-    return response[0], response[1]
+    # Call the undecorated view; the decorated one returns an already-cached Response
+    return get_set.__wrapped__(set_code)
@@ -13,6 +13,10 @@ class CardSearchSchema(Schema):
     colors = fields.List(fields.String())
     page = fields.Integer(validate=validate.Range(min=1))
     per_page = fields.Integer(validate=validate.Range(min=1, max=100))
+    cursor = fields.String()
+    include_total = fields.Boolean()
+    count = fields.String(validate=validate.OneOf(['exact', 'estimate', 'none']))
+    selected_fields = fields.String(data_key='fields')
 
 class SetSearchSchema(Schema):
     """Schema for set search parameters."""
@@ -4,11 +4,13 @@ from models.card import Card
 from sqlalchemy import func, Float
 from database import db
 import orjson
+from cache import versioned_key
+from redis.exceptions import RedisError
 import logging
 
 logger = logging.getLogger(__name__)
 
-def get_stats(quantity_regular_field: str, quantity_foil_field: str, cache_key: str) -> Any:
+def get_stats(quantity_regular_field: str, quantity_foil_field: str, cache_key: str, domain: str = 'collection') -> Any:
     """
     Generic function to get stats for collection or kiosk.
     
@@ -16,12 +18,18 @@ def get_stats(quantity_regular_field: str, quantity_foil_field: str, cache_key:
         quantity_regular_field (str): The field name for regular quantity.
         quantity_foil_field (str): The field name for foil quantity.
         cache_key (str): The cache key to use for Redis.
+        domain (str): The inventory domain whose generation versions the cache key.
     
     Returns:
         flask.Response: A Flask response object containing the stats.
     """
     redis_client = current_app.redis_client
-    cached_data = redis_client.get(cache_key)
+    try:
+        cache_key = versioned_key(cache_key, [domain])
+        cached_data = redis_client.get(cache_key)
+    except RedisError as e:
+        logger.warning(f"Cache unavailable for {cache_key}: {str(e)}")
+        cache_key, cached_data = None, None
 
     if cached_data:
         return current_app.response_class(
@@ -55,7 +63,11 @@ def get_stats(quantity_regular_field: str, quantity_foil_field: str, cache_key:
         }
 
         serialized_data = orjson.dumps(result).decode()
-        redis_client.setex(cache_key, 3600, serialized_data)  # Cache for 1 hour
+        if cache_key:
+            try:
+                redis_client.setex(cache_key, 3600, serialized_data)  # Cache for 1 hour
+            except RedisError as e:
+                logger.warning(f"Could not cache {cache_key}: {str(e)}")
 
         return current_app.response_class(
             response=serialized_data,
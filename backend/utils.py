@@ -1,13 +1,24 @@
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 from functools import wraps
-from flask import current_app, request, jsonify, Response
+from flask import current_app, request, Response
 from decimal import Decimal
 import orjson
 import logging
-from time import time
+from time import time, perf_counter
+from redis.exceptions import RedisError
+from cache import (
+    resolve_key, request_set_code, get_local_cache, CacheEntry,
+    read_entry, read_entry_meta, write_entry, wait_for_entry, available_compression, offline_key
+)
+from metrics import record_request
+from formats import JSON_MIMETYPE, negotiate_format, transcode
 
 logger = logging.getLogger(__name__)
 
+def escape_like(value: str) -> str:
+    """Escape LIKE wildcards so user input matches literally (use with escape='\\')."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
 def safe_float(value: Any) -> float:
     try:
         return float(value)
@@ -24,67 +35,244 @@ def convert_decimals(obj: Any) -> Union[float, Dict, List, Any]:
     else:
         return obj
 
-def cache_response(timeout: int = 300):
+def cache_response(timeout: Optional[int] = None, hard_timeout: Optional[int] = None,
+                   domains: Iterable[str] = (), local: bool = False, formats: Iterable[str] = ()):
     """
     Cache the response of a route for a given timeout period.
 
+    Cache keys embed the generation counters of the inventory domains the route
+    reads, so writes invalidate entries by bumping a counter (see
+    `cache.invalidate_cache`) instead of deleting keys. Routes scoped to a set,
+    via a `set_code` URL or query parameter, use that set's counters.
+
+    Entries are fresh for `timeout` seconds and kept until `hard_timeout`. Only
+    one worker recomputes a missing or stale entry, guarded by a short Redis
+    lock; meanwhile other requests are served the stale copy, or poll briefly
+    for the fresh value when there is none.
+
+    The response is serialized once and the same bytes are cached and returned,
+    along with a content-hash ETag. Requests whose If-None-Match matches get an
+    empty 304 built from the cached metadata alone. Bodies above
+    CACHE_COMPRESS_MIN_BYTES are stored compressed and passed through as is to
+    clients that accept the encoding.
+
+    Every request records its outcome, latency and payload size per route (see
+    `metrics.record_request`).
+
+    If Redis is unreachable, or its circuit breaker is open, the view is served
+    without Redis: from the worker's local tier when the route uses it, and
+    otherwise rendered directly.
+
+    Routes listing binary `formats` negotiate them from the Accept header. The
+    view's JSON is transcoded once on a miss and each format is cached under
+    its own key, so hits cost the same in every format. A client that accepts
+    none of the formats the server can produce gets a 406.
+
     Args:
-        timeout (int): The timeout in seconds for the cache. Defaults to 300 seconds.
+        timeout (Optional[int]): Soft TTL in seconds. Defaults to CACHE_DEFAULT_TIMEOUT.
+        hard_timeout (Optional[int]): Hard TTL in seconds. Defaults to the soft TTL plus CACHE_STALE_GRACE.
+        domains (Iterable[str]): Inventory domains the route depends on ('collection', 'kiosk').
+        local (bool): Also keep the serialized response in the worker's in-memory LRU tier.
+        formats (Iterable[str]): Binary mimetypes offered besides JSON (see formats.py).
 
     Returns:
         A decorator that caches the response.
     """
+    domains = tuple(domains)
+    formats = tuple(formats)
+
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            sorted_args = orjson.dumps(sorted(request.args.items()))
-            cache_key = f"{func.__name__}:{request.full_path}:{sorted_args}"
+            request_start = perf_counter()
+            sorted_args = orjson.dumps(sorted(request.args.items(multi=True))).decode()
+            base_key = f"{func.__name__}:{request.path}:{sorted_args}"
+            mimetype = negotiate_format(formats)
+            if mimetype is None:
+                body = {"error": "Not acceptable", "formats": [JSON_MIMETYPE, *formats]}
+                response = current_app.response_class(orjson.dumps(body), status=406, mimetype=JSON_MIMETYPE)
+                response.vary.add('Accept')
+                return response
+            if mimetype != JSON_MIMETYPE:
+                base_key = f"{base_key}:{mimetype}"
+            try:
+                response, outcome = serve(base_key, mimetype, *args, **kwargs)
+            except RedisError as e:
+                # Redis only fails before the view runs, so it is safe to render without it
+                logger.warning(f"Cache unavailable for {func.__name__}, serving without Redis: {str(e)}")
+                response, outcome = serve_degraded(base_key, mimetype, *args, **kwargs)
+            if formats:
+                response.vary.add('Accept')
+                if response.status_code == 200:
+                    response.mimetype = mimetype
+            record_request(request.endpoint or func.__name__, outcome, perf_counter() - request_start,
+                           response.content_length or 0)
+            return response
+
+        def render(mimetype: str, args, kwargs) -> Tuple[bytes, int]:
+            body, status_code = render_view(func, args, kwargs)
+            if status_code == 200:
+                body = transcode(body, mimetype)
+            return body, status_code
+
+        def serve(base_key: str, mimetype: str, *args, **kwargs) -> Tuple[Response, str]:
+            config = current_app.config
+            cache_key, generation_deps = resolve_key(base_key, domains, request_set_code(kwargs))
+            soft_timeout = timeout or config['CACHE_DEFAULT_TIMEOUT']
+            cache_timeout = hard_timeout or soft_timeout + config['CACHE_STALE_GRACE']
             redis_client = current_app.redis_client
+            local_cache = get_local_cache() if local else None
+
+            # Attempt to retrieve cached data, from this worker's memory first
+            entry = local_cache.get(cache_key) if local_cache else None
+            if entry and entry.is_fresh:
+                logger.info(f"Local cache hit for key: {cache_key}")
+                return cached_entry_response(entry), 'local_hit'
+
+            # A revalidating client only needs the metadata to get its 304
+            if request.if_none_match:
+                meta = read_entry_meta(cache_key)
+                if meta and time() < meta[1] and request.if_none_match.contains_weak(meta[0]):
+                    logger.info(f"Cache hit (not modified) for key: {cache_key}")
+                    return not_modified_response(meta[0]), 'not_modified'
 
-            # Attempt to retrieve cached data
-            cached_data = redis_client.get(cache_key)
-            if cached_data:
-                logger.info(f"Cache hit for key: {cache_key}")
-                return current_app.response_class(
-                    response=cached_data,
-                    status=200,
-                    mimetype='application/json'
-                )
+            entry = read_entry(cache_key)
+            if entry:
+                if local_cache:
+                    local_cache.set(cache_key, entry, cache_timeout, generation_deps)
+                if entry.is_fresh:
+                    logger.info(f"Cache hit for key: {cache_key}")
+                    return cached_entry_response(entry), 'hit'
+
+            # Missing or stale: only the lock holder recomputes
+            lock = redis_client.lock(f"lock:{cache_key}", timeout=config['CACHE_LOCK_TIMEOUT'], blocking=False)
+            if not lock.acquire():
+                if entry:
+                    logger.info(f"Serving stale entry while another worker refreshes key: {cache_key}")
+                    return cached_entry_response(entry), 'stale'
+                entry = wait_for_entry(cache_key, config['CACHE_LOCK_WAIT'])
+                if entry:
+                    logger.info(f"Cache filled by another worker for key: {cache_key}")
+                    return cached_entry_response(entry), 'hit'
+                logger.warning(f"Timed out waiting for key: {cache_key}, computing it anyway")
+                lock = None
 
             # Cache miss, proceed with executing the function
             logger.info(f"Cache miss for key: {cache_key}")
             start_time = time()
             try:
-                # Execute the original view function
-                response = func(*args, **kwargs)
-                end_time = time()
-
-                # Determine if response is tuple (data, status_code)
-                if isinstance(response, tuple):
-                    data, status_code = response
-                else:
-                    data = response
-                    status_code = 200  # Default to 200 if not specified
-
-                # Only cache successful responses
-                if 200 <= status_code < 300:
-                    # Apply convert_decimals here
-                    data = convert_decimals(data)
-                    data_serialized = orjson.dumps(data).decode('utf-8')
-                    redis_client.setex(cache_key, timeout, data_serialized)
-                    logger.info(f"Cached response for key: {cache_key} with timeout: {timeout}")
-
-                # Return the response as a Flask Response object
-                return jsonify(data), status_code
-            except Exception as e:
-                logger.exception(f"Error in {func.__name__}: {str(e)}")
-                raise
+                body, status_code = render(mimetype, args, kwargs)
+
+                # Only cache (and ETag) 200 responses
+                if status_code == 200:
+                    entry = build_entry(body, soft_timeout)
+                    try:
+                        write_entry(cache_key, entry, cache_timeout)
+                    except RedisError as e:
+                        logger.warning(f"Could not store cache entry for key {cache_key}: {str(e)}")
+                    if local_cache:
+                        local_cache.set(cache_key, entry, cache_timeout, generation_deps)
+                    logger.info(f"Cached response for key: {cache_key} with timeout: {soft_timeout}/{cache_timeout}")
+                    return cached_entry_response(entry, identity_body=body), 'miss'
+
+                return current_app.response_class(response=body, status=status_code, mimetype='application/json'), 'error'
             finally:
+                if lock is not None:
+                    try:
+                        lock.release()
+                    except RedisError:
+                        logger.warning(f"Cache lock for key {cache_key} expired before release")
                 # Log the response time
-                logger.info(f"Response time for {func.__name__}: {end_time - start_time:.4f} seconds")
+                logger.info(f"Response time for {func.__name__}: {time() - start_time:.4f} seconds")
+
+        def serve_degraded(base_key: str, mimetype: str, *args, **kwargs) -> Tuple[Response, str]:
+            """Serve without Redis, from and into the worker's local tier when the route uses it."""
+            versioned = offline_key(base_key, domains, request_set_code(kwargs)) if local else None
+            local_cache = current_app.local_cache if versioned else None
+            if local_cache:
+                entry = local_cache.get(versioned[0])
+                if entry:
+                    return cached_entry_response(entry), 'local_hit'
+
+            body, status_code = render(mimetype, args, kwargs)
+            if status_code != 200:
+                return current_app.response_class(response=body, status=status_code, mimetype='application/json'), 'error'
+
+            soft_timeout = timeout or current_app.config['CACHE_DEFAULT_TIMEOUT']
+            entry = build_entry(body, soft_timeout)
+            if local_cache:
+                local_cache.set(versioned[0], entry, soft_timeout, versioned[1])
+            return cached_entry_response(entry, identity_body=body), 'bypass'
         return wrapper
     return decorator
 
 
-def serialize_cards(cards: List[Any], quantity_type: str = 'collection') -> List[Dict]:
-    return [card.to_dict(quantity_type=quantity_type) for card in cards]
+def render_view(func, args, kwargs) -> Tuple[bytes, int]:
+    """Run a cached view and serialize its result once, returning the body and status code."""
+    try:
+        response = func(*args, **kwargs)
+    except Exception as e:
+        logger.exception(f"Error in {func.__name__}: {str(e)}")
+        raise
+
+    # Determine if response is tuple (data, status_code); a bare Response carries its own
+    if isinstance(response, tuple):
+        data, status_code = response
+    else:
+        data = response
+        status_code = data.status_code if isinstance(data, Response) else 200
+
+    # Serialize once; the same bytes are cached and returned
+    if isinstance(data, Response):
+        return data.get_data(), status_code
+    return orjson.dumps(data, default=orjson_default), status_code
+
+
+def build_entry(body: bytes, timeout: int) -> CacheEntry:
+    config = current_app.config
+    return CacheEntry.build(
+        body, timeout,
+        compression=available_compression(config['CACHE_COMPRESSION']),
+        compress_min_bytes=config['CACHE_COMPRESS_MIN_BYTES']
+    )
+
+def orjson_default(obj: Any) -> Any:
+    """Serialize types orjson does not handle natively."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def cached_entry_response(entry: CacheEntry, identity_body: Optional[bytes] = None) -> Response:
+    """
+    Build a JSON response from a cached entry, or a 304 if the client already has it.
+
+    Compressed entries are passed through untouched to clients that accept their
+    encoding and decompressed for the rest. The ETag hashes the uncompressed body,
+    so it is marked weak on encoded responses.
+    """
+    if request.if_none_match.contains_weak(entry.etag):
+        return not_modified_response(entry.etag)
+
+    if entry.encoding and request.accept_encodings[entry.encoding]:
+        response = current_app.response_class(response=entry.body, status=200, mimetype='application/json')
+        response.headers['Content-Encoding'] = entry.encoding
+        response.set_etag(entry.etag, weak=True)
+    else:
+        body = identity_body if identity_body is not None else entry.identity_body
+        response = current_app.response_class(response=body, status=200, mimetype='application/json')
+        response.set_etag(entry.etag)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def not_modified_response(etag: str) -> Response:
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def serialize_cards(cards: List[Any], quantity_type: str = 'collection', fields: Optional[Tuple[str, ...]] = None) -> List[Dict]:
+    return [card.to_dict(quantity_type=quantity_type, fields=fields) for card in cards]
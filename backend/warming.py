@@ -0,0 +1,98 @@
+from typing import Any, Dict, Iterable, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from time import perf_counter
+from models.set import Set
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Query string the Collection view sends for its default listing
+DEFAULT_COLLECTION_SETS_PARAMS = [
+    ('name', ''),
+    *(('set_type[]', set_type) for set_type in
+      ('core', 'expansion', 'masters', 'draft_innovation', 'funny', 'commander')),
+    ('sort_by', 'released_at'),
+    ('sort_order', 'desc'),
+    ('per_page', 50),
+]
+
+STATS_URLS = ['/api/collection/stats', '/api/kiosk/stats']
+
+
+def set_page_urls(set_code: str) -> List[str]:
+    """URLs of the cached per-set pages."""
+    return [f'/api/sets/{set_code}/cards', f'/api/sets/{set_code}/details']
+
+
+def collection_sets_url(page: int) -> str:
+    return f"/api/collection/sets?{urlencode(DEFAULT_COLLECTION_SETS_PARAMS + [('page', page)])}"
+
+
+def warm_url(app, url: str) -> bool:
+    """Request a URL through the app so cache_response stores its entry."""
+    try:
+        response = app.test_client().get(url)
+    except Exception as e:
+        logger.exception(f"Cache warming failed for {url}: {str(e)}")
+        return False
+    if response.status_code != 200:
+        logger.warning(f"Cache warming got {response.status_code} for {url}")
+        return False
+    return True
+
+
+def warm_cache(app, set_codes: Optional[Iterable[str]] = None, concurrency: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Pre-render the hot cached pages.
+
+    Covers the per-set card and detail pages, every page of the default
+    collection sets listing and the stats endpoints. Requests run through the
+    app on a bounded thread pool so the database sees at most `concurrency`
+    queries at a time.
+
+    Args:
+        app: The Flask application.
+        set_codes (Optional[Iterable[str]]): Sets to warm. Defaults to every set.
+        concurrency (Optional[int]): Parallel requests. Defaults to CACHE_WARM_CONCURRENCY.
+
+    Returns:
+        Dict[str, Any]: Counts of warmed and failed URLs and the elapsed time.
+    """
+    start_time = perf_counter()
+    concurrency = concurrency or app.config['CACHE_WARM_CONCURRENCY']
+
+    with app.app_context():
+        if set_codes is None:
+            set_codes = [code for (code,) in Set.query.with_entities(Set.code).order_by(Set.released_at.desc())]
+        set_codes = list(set_codes)
+
+    # The first listing page tells us how many more there are
+    first_page = app.test_client().get(collection_sets_url(1))
+    results = [first_page.status_code == 200]
+    urls = list(STATS_URLS)
+    if first_page.status_code == 200:
+        urls += [collection_sets_url(page) for page in range(2, (first_page.get_json().get('pages') or 1) + 1)]
+    for set_code in set_codes:
+        urls.extend(set_page_urls(set_code))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results += executor.map(lambda url: warm_url(app, url), urls)
+
+    summary = {
+        'sets': len(set_codes),
+        'warmed': sum(results),
+        'failed': len(results) - sum(results),
+        'elapsed_seconds': round(perf_counter() - start_time, 2)
+    }
+    logger.info(f"Cache warming finished: {summary}")
+    return summary
+
+
+def warm_cache_in_background(app, set_codes: Optional[Iterable[str]] = None) -> threading.Thread:
+    """Run warm_cache on a daemon thread, e.g. after an import commits."""
+    set_codes = list(set_codes) if set_codes is not None else None
+    thread = threading.Thread(target=warm_cache, args=(app, set_codes), daemon=True, name='cache-warmer')
+    thread.start()
+    return thread